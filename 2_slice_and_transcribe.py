@@ -1,7 +1,19 @@
 import os
+import re
 import glob
+import json
+import time
+import hashlib
+import tempfile
+import argparse
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import librosa
+import numpy as np
 import soundfile as sf
+import soxr  # streaming resampler, installed with librosa
 import whisper
 import warnings
 import torch
@@ -11,20 +23,698 @@ from config import *  # Imports paths from config.py
 # Ignore librosa warnings
 warnings.filterwarnings("ignore")
 
+# Hallucination Filters
+BAD_STARTS = ["Subtitle", "Copyright", "Translated", "Captioning"]
+
 def check_raw_files():
     files = glob.glob(os.path.join(RAW_AUDIO_DIR, "*"))
     # Filter for audio extensions
     audio_files = [f for f in files if f.lower().endswith(('.mp3', '.wav', '.m4a', '.flac', '.ogg'))]
-    
+
     if not audio_files:
         print(f"❌ ERROR: No audio files found in '{RAW_AUDIO_DIR}/'")
         print("   Please put your recordings there first.")
         return []
     return audio_files
 
+# --- SEGMENTATION ---
+# Raw files are streamed in blocks, never loaded whole, so a multi-hour
+# recording needs about as much memory as a short one.
+STREAM_BLOCK_SECONDS = 30
+# Silence detection (Top DB 40 is standard for clean speech)
+TOP_DB = 40
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+def stream_audio(raw_file, block_seconds=STREAM_BLOCK_SECONDS):
+    """Yields a raw file as 22050Hz mono float32 blocks, decoding and resampling as it goes."""
+    try:
+        f = sf.SoundFile(raw_file)
+    except Exception:
+        # Formats libsndfile can't read (e.g. m4a) go through librosa in one piece
+        y, _ = librosa.load(raw_file, sr=SAMPLE_RATE, mono=True)
+        block = int(block_seconds * SAMPLE_RATE)
+        for i in range(0, len(y), block):
+            yield y[i:i + block]
+        return
+
+    with f:
+        resampler = None
+        if f.samplerate != SAMPLE_RATE:
+            resampler = soxr.ResampleStream(f.samplerate, SAMPLE_RATE, 1, dtype='float32', quality='soxr_hq')
+        for block in f.blocks(blocksize=int(block_seconds * f.samplerate), dtype='float32', always_2d=True):
+            y = block.mean(axis=1)
+            yield resampler.resample_chunk(y) if resampler else y
+        if resampler:
+            yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+def hop_energy(samples):
+    """Sum of squares of every full hop in samples, plus the leftover samples."""
+    n = len(samples) // HOP_LENGTH
+    hops = samples[:n * HOP_LENGTH].reshape(n, HOP_LENGTH)
+    return np.einsum('ij,ij->i', hops, hops).astype(np.float64), samples[n * HOP_LENGTH:]
+
+def frame_power(blocks):
+    """
+    Mean-square energy of every analysis frame, with the same centred framing as
+    librosa.feature.rms. Each sample is squared once into per-hop sums, and a frame
+    is the sum of FRAME_LENGTH // HOP_LENGTH neighbouring hops. Unfinished hops and
+    frames are carried over, so block boundaries don't change the result.
+    Returns (power per frame, total samples).
+    """
+    hops_per_frame = FRAME_LENGTH // HOP_LENGTH
+    pad = np.zeros(FRAME_LENGTH // 2, dtype=np.float32)
+    carry = pad                  # samples not yet filling a hop
+    hop_carry = np.zeros(0)      # hops still waiting for the rest of their frame
+    powers = []
+    n_samples = 0
+
+    def add_frames(*hop_parts):
+        hops = np.concatenate(hop_parts)
+        n_frames = max(len(hops) - hops_per_frame + 1, 0)
+        frames = sum(hops[i:i + n_frames] for i in range(hops_per_frame))
+        powers.append((frames / FRAME_LENGTH).astype(np.float32))
+        return hops[n_frames:]
+
+    for block in blocks:
+        n_samples += len(block)
+        block = block.astype(np.float32, copy=False)
+        # Complete the carried partial hop first, so the block itself is never copied
+        k = min(-len(carry) % HOP_LENGTH, len(block))
+        head, rest = hop_energy(np.concatenate((carry, block[:k])))
+        body, carry = hop_energy(block[k:])
+        if len(rest): carry = rest  # block too short to finish the hop
+        hop_carry = add_frames(hop_carry, head, body)
+
+    last, _ = hop_energy(np.concatenate((carry, pad)))
+    add_frames(hop_carry, last)
+    return np.concatenate(powers), n_samples
+
+def find_intervals(power, n_samples, top_db=TOP_DB):
+    """Non-silent (start, end) sample intervals, as librosa.effects.split(top_db=...) finds them."""
+    db = 10 * np.log10(np.maximum(power, 1e-10))
+    non_silent = db > 10 * np.log10(max(float(power.max()), 1e-10)) - top_db
+
+    # Frames where silence starts or stops
+    edges = np.flatnonzero(np.diff(non_silent.astype(np.int8))) + 1
+    if non_silent[0]: edges = np.concatenate(([0], edges))
+    if non_silent[-1]: edges = np.concatenate((edges, [len(non_silent)]))
+    return np.minimum(edges * HOP_LENGTH, n_samples).reshape(-1, 2)
+
+def cut_segments(blocks, intervals):
+    """Yields (start, end, audio) for sorted sample intervals of a block stream."""
+    intervals = iter(intervals)
+    current = next(intervals, None)
+    pieces = []
+    pos = 0
+    for block in blocks:
+        block_end = pos + len(block)
+        while current is not None:
+            start, end = current
+            if start >= block_end: break
+            pieces.append(block[max(start - pos, 0):min(end, block_end) - pos])
+            if end > block_end: break  # continues in the next block
+            yield start, end, np.concatenate(pieces)
+            pieces = []
+            current = next(intervals, None)
+        if current is None: break  # nothing left to cut, stop decoding
+        pos = block_end
+
+def split_long(intervals, power, min_len, max_len):
+    """Splits intervals longer than max_len at their quietest frame, never leaving a piece under min_len."""
+    pieces = []
+    for start, end in intervals:
+        while end - start > max_len:
+            # Candidate cut points keep both sides within bounds
+            lo = -(-(start + min_len) // HOP_LENGTH)
+            hi = min(start + max_len, end - min_len) // HOP_LENGTH
+            cut = lo + int(np.argmin(power[lo:hi + 1])) if hi >= lo else hi
+            cut = cut * HOP_LENGTH
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+    return pieces
+
+def merge_short(intervals, min_len, max_len, max_gap):
+    """Joins intervals shorter than min_len with a neighbour across a short pause."""
+    merged = []
+    for start, end in intervals:
+        if merged:
+            prev_start, prev_end = merged[-1]
+            short = prev_end - prev_start < min_len or end - start < min_len
+            if short and start - prev_end <= max_gap and end - prev_start <= max_len:
+                merged[-1] = (prev_start, end)
+                continue
+        merged.append((start, end))
+    return merged
+
+def speech_before(intervals, points):
+    """Non-silent samples before each sample position, for sorted non-overlapping intervals."""
+    done = np.concatenate(([0], np.cumsum(intervals[:, 1] - intervals[:, 0])))
+    i = np.searchsorted(intervals[:, 1], points, side="right")
+    starts = np.append(intervals[:, 0], np.iinfo(np.int64).max)
+    return done[i] + np.maximum(points - starts[i], 0)
+
+def plan_segments(power, n_samples, min_seconds=SEGMENT_MIN_SECONDS, max_seconds=SEGMENT_MAX_SECONDS,
+                  max_gap_seconds=SEGMENT_MAX_GAP_SECONDS):
+    """
+    Turns frame energy into clip intervals (in samples) of min-max seconds.
+    Instead of dropping what doesn't fit, long stretches of speech are split at
+    their quietest point and short ones merged with a neighbour.
+    Returns (intervals, stats) with the seconds of speech found and kept.
+    """
+    min_len, max_len = int(min_seconds * SAMPLE_RATE), int(max_seconds * SAMPLE_RATE)
+    intervals = find_intervals(power, n_samples)
+    lengths = intervals[:, 1] - intervals[:, 0]
+
+    pieces = merge_short(split_long(intervals, power, min_len, max_len), min_len, max_len,
+                         int(max_gap_seconds * SAMPLE_RATE))
+    pieces = np.array(pieces, dtype=np.int64).reshape(-1, 2)
+    piece_lengths = pieces[:, 1] - pieces[:, 0]
+    usable = pieces[(piece_lengths >= min_len) & (piece_lengths <= max_len)]
+
+    stats = {
+        "found": len(intervals),
+        "speech": float(lengths.sum() / SAMPLE_RATE),
+        # What a plain length filter (the old slicer) would have kept
+        "filtered": float(lengths[(lengths >= min_len) & (lengths <= max_len)].sum() / SAMPLE_RATE),
+        # Speech inside the clips, not the pauses merged clips bridge
+        "kept": float((speech_before(intervals, usable[:, 1]) - speech_before(intervals, usable[:, 0])).sum()
+                      / SAMPLE_RATE),
+    }
+    return usable, stats
+
+def plan_file(raw_file):
+    """First pass over a raw file: frame energy -> clip intervals and yield stats."""
+    power, n_samples = frame_power(stream_audio(raw_file))
+    return plan_segments(power, n_samples)
+
+def iter_segments(raw_file, intervals):
+    """
+    Second pass: yields the planned clips as (start, end, chunk), with start/end
+    in seconds and chunk at 22050Hz mono, each as soon as it is decoded.
+    """
+    for start, end, chunk in cut_segments(stream_audio(raw_file), intervals):
+        yield round(start / SAMPLE_RATE, 3), round(end / SAMPLE_RATE, 3), chunk
+
+def describe_yield(stats):
+    speech = max(stats["speech"], 1e-9)
+    return (f"kept {stats['kept']:.0f}s of {stats['speech']:.0f}s speech ({100 * stats['kept'] / speech:.0f}%, "
+            f"length filter alone: {100 * stats['filtered'] / speech:.0f}%)")
+
+def load_segments(raw_file, verbose=True):
+    """All usable clips of a raw file as a list."""
+    intervals, stats = plan_file(raw_file)
+    if verbose:
+        print(f"   -> Found {stats['found']} potential segments, {len(intervals)} clips: {describe_yield(stats)}")
+    return list(iter_segments(raw_file, intervals))
+
+# --- INGESTION MANIFEST ---
+# Append-only JSONL log of what has been ingested. One line per event:
+#   {"event": "file", "file": ..., "hash": ..., "status": "started" | "done" | "error" | "removed"}
+#   {"event": "clip", "file": ..., "clip": ..., "start": ..., "end": ..., "text": ...}
+# Replaying it tells a rerun which raw files are finished, which changed,
+# and which clips of an interrupted file already exist.
+MANIFEST_PATH = os.path.join(DATASET_DIR, "ingest_manifest.jsonl")
+CLIP_NUMBER = re.compile(r"_(\d+)\.wav$")
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest():
+    """Replays the manifest into {file: {"hash", "status", "clips"}} and the next free clip number."""
+    files = {}
+    next_number = 1
+    if not os.path.exists(MANIFEST_PATH):
+        return files, next_number
+
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # half-written last line of a crashed run
+            entry = files.setdefault(record["file"], {"hash": None, "status": None, "clips": []})
+            if record["event"] == "clip":
+                entry["clips"].append(record)
+                match = CLIP_NUMBER.search(record["clip"])
+                if match: next_number = max(next_number, int(match.group(1)) + 1)
+            elif record["status"] == "removed":
+                entry.update(hash=None, status=None, clips=[])
+            else:
+                entry["hash"] = record.get("hash", entry["hash"])
+                entry["status"] = record["status"]
+    return files, next_number
+
+def append_durably(f, text):
+    """Appends and forces it to disk, so a crash never loses a finished clip."""
+    f.write(text)
+    f.flush()
+    os.fsync(f.fileno())
+
+def log_event(f, **record):
+    append_durably(f, json.dumps(record, ensure_ascii=False) + "\n")
+
+def open_append(path):
+    """
+    Opens a line-based file for appending, making sure the next line starts on
+    its own line (metadata.csv without a final newline, or a torn manifest line).
+    """
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    f = open(path, 'a', encoding='utf-8')
+    if needs_newline: append_durably(f, "\n")
+    return f
+
+def remove_clips(clips, wavs_dir, metadata_path):
+    """Deletes the clips of a changed raw file and their metadata lines."""
+    names = {c["clip"] for c in clips}
+    for name in names:
+        path = os.path.join(wavs_dir, name)
+        if os.path.exists(path): os.remove(path)
+
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            lines = [l for l in f.read().splitlines() if l.split("|", 1)[0] not in names]
+        # Write then rename, so an interrupted run never truncates metadata.csv
+        tmp_path = metadata_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("".join(l + "\n" for l in lines))
+        os.replace(tmp_path, metadata_path)
+
+# --- PIPELINE STAGES ---
+# decode pool (processes) -> segment queue -> Whisper (main thread) -> writer thread
+
+# Segments waiting for Whisper. Bounded so decoding can't run away from the GPU.
+SEGMENT_QUEUE_SIZE = 256
+
+def decode_worker(raw_file, segment_queue, skip_starts=()):
+    """
+    Runs in a worker process: decodes + slices one file and queues its clips.
+    Clips starting at skip_starts were ingested by an interrupted run.
+    """
+    try:
+        intervals, stats = plan_file(raw_file)
+        # Clips are queued as they are cut, long before the whole file is decoded
+        for start, end, chunk in iter_segments(raw_file, intervals):
+            if start in skip_starts: continue
+            segment_queue.put(("segment", raw_file, (start, end, chunk)))
+    except Exception as e:
+        segment_queue.put(("error", raw_file, str(e)))
+        return
+    segment_queue.put(("done", raw_file, {"segments": len(intervals), **stats}))
+
+def writer_thread(write_queue, wavs_dir, metadata_path, errors):
+    """
+    Writes accepted clips to disk so file I/O overlaps transcription. Each clip
+    is appended to metadata.csv and the manifest as soon as its wav exists.
+    A failure is put in `errors` for the main thread to raise; the queue is
+    still drained, so the main thread never blocks on it.
+    """
+    try:
+        write_items(write_queue, wavs_dir, metadata_path)
+    except Exception as e:
+        errors.append(e)
+        while write_queue.get() is not None:
+            pass
+
+def write_items(write_queue, wavs_dir, metadata_path):
+    with open_append(MANIFEST_PATH) as manifest, open_append(metadata_path) as metadata:
+        while True:
+            item = write_queue.get()
+            if item is None: break
+            kind, raw_file = item[0], os.path.basename(item[1])
+
+            if kind == "clip":
+                _, _, filename, start, end, chunk, text = item
+                # Save as 16-bit PCM WAV (Crucial for Piper)
+                sf.write(os.path.join(wavs_dir, filename), chunk, SAMPLE_RATE, subtype='PCM_16')
+                log_event(manifest, event="clip", file=raw_file, clip=filename, start=start, end=end, text=text)
+                append_durably(metadata, f"{filename}|{text}\n")
+            else:
+                _, _, file_hash, status, detail = item
+                log_event(manifest, event="file", file=raw_file, hash=file_hash, status=status, **detail)
+
+def next_batch(segment_queue, batch_size, pending_files):
+    """
+    Collects up to batch_size clips. Waits a while for the first one, then
+    only briefly for more, so Whisper never idles long on a half-full batch.
+    Returns the (raw_file, segment) batch and the files that finished slicing.
+    """
+    batch, finished = [], []
+    while pending_files and len(batch) < batch_size:
+        try:
+            kind, raw_file, payload = segment_queue.get(timeout=5 if not batch else 0.5)
+        except queue.Empty:
+            break
+        if kind == "segment":
+            batch.append((raw_file, payload))
+        elif kind == "done":
+            pending_files.discard(raw_file)
+            finished.append((raw_file, "done", {"segments": payload["segments"]}))
+            print(f"\n   ✔️  Sliced {os.path.basename(raw_file)}: {payload['segments']} usable segments, "
+                  f"{describe_yield(payload)}")
+        else:
+            pending_files.discard(raw_file)
+            finished.append((raw_file, "error", {"error": payload}))
+            print(f"\n   ⚠️  Skipping corrupt file {os.path.basename(raw_file)}: {payload}")
+    return batch, finished
+
+# --- TRANSCRIPTION ---
+
+# Largest first. Rough memory (GB) each needs for single-clip decoding;
+# 'medium' is a good balance, 'large' wants 12GB+ VRAM.
+WHISPER_MEMORY_GB = {"large": 10, "medium": 5, "small": 2, "base": 1, "tiny": 1}
+# On CPU, speed is the limit long before memory: biggest model per core count
+CPU_MODEL_FOR_CORES = ((16, "medium"), (8, "small"), (0, "base"))
+
+def available_memory_gb(device):
+    """Free VRAM on cuda, available RAM on CPU (None if unknown)."""
+    if device == "cuda":
+        free, _ = torch.cuda.mem_get_info()
+        return free / 1024 ** 3
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024 ** 2
+    except OSError:
+        pass
+    return None
+
+def choose_whisper(device):
+    """
+    (model size, int8 quantization) from config.py, resolving "auto": the
+    largest model that fits in free memory with the configured batch size, and
+    on CPU no bigger than the core count can run at a usable speed.
+    """
+    quantize = device == "cpu" and WHISPER_QUANTIZE
+    if WHISPER_MODEL != "auto":
+        return WHISPER_MODEL, quantize
+
+    sizes = list(WHISPER_MEMORY_GB)
+    if device == "cpu":
+        cores = os.cpu_count() or 1
+        cap = next(name for min_cores, name in CPU_MODEL_FOR_CORES if cores >= min_cores)
+        sizes = sizes[sizes.index(cap):]
+
+    memory = available_memory_gb(device)
+    if memory is None:
+        return sizes[0], quantize
+    # Batched decoding needs activations for every clip in the batch
+    headroom = 1 + WHISPER_BATCH_SIZE / 64
+    for name in sizes:
+        if WHISPER_MEMORY_GB[name] * headroom <= memory:
+            return name, quantize
+    return sizes[-1], quantize
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of every Linear layer (CPU only): ~4x smaller weights, faster matmuls."""
+    for module in model.modules():
+        # Whisper's Linear subclass only adds a dtype cast; quantize_dynamic wants the plain class
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_whisper(model_name=None, quantize=None):
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    auto_name, auto_quantize = choose_whisper(device)
+    model_name = model_name or auto_name
+    quantize = auto_quantize if quantize is None else quantize and device == "cpu"
+
+    print(f"\n🧠 Loading Whisper Model ({model_name}{', int8' if quantize else ''} on {device})...")
+    model = whisper.load_model(model_name, device=device)
+    return quantize_int8(model.eval()) if quantize else model
+
+def clip_to_mel(chunk, n_mels):
+    """Whisper input for an in-memory clip: 16kHz, padded to 30s, log-mel."""
+    audio = librosa.resample(chunk, orig_sr=SAMPLE_RATE, target_sr=whisper.audio.SAMPLE_RATE)
+    audio = whisper.pad_or_trim(audio.astype(np.float32))
+    return whisper.log_mel_spectrogram(audio, n_mels)
+
+def transcribe_batch(model, chunks, batch_size=WHISPER_BATCH_SIZE):
+    """
+    Transcribes in-memory clips, many per forward pass. Clips are grouped by
+    length so a batch finishes decoding at about the same time.
+    Returns the texts in the same order as chunks.
+    """
+    texts = [""] * len(chunks)
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+    # fp16 only works on GPU; the CPU path decodes in fp32
+    options = whisper.DecodingOptions(language="en", without_timestamps=True,
+                                      fp16=model.device.type == "cuda")
+
+    for b in range(0, len(order), batch_size):
+        batch = order[b:b + batch_size]
+        mels = torch.stack([clip_to_mel(chunks[i], model.dims.n_mels) for i in batch]).to(model.device)
+        with torch.no_grad():
+            results = whisper.decode(model, mels, options)
+        for i, result in zip(batch, results):
+            texts[i] = result.text.strip().replace("\n", " ")
+    return texts
+
+def is_hallucination(text):
+    return any(text.startswith(b) for b in BAD_STARTS) or len(text) < 2
+
+def benchmark(batch_sizes=(1, 2, 4, 8, 16, 32), max_clips=64):
+    """Clips/sec of batched transcription on real clips from raw_audio/."""
+    print(f"--- 📊 Whisper Batch Benchmark ---")
+    raw_files = check_raw_files()
+    if not raw_files:
+        return
+
+    clips = []
+    for raw_file in raw_files:
+        print(f"   Reading: {os.path.basename(raw_file)}")
+        clips.extend(chunk for _, _, chunk in load_segments(raw_file))
+        if len(clips) >= max_clips: break
+    clips = clips[:max_clips]
+    if not clips:
+        print("❌ No usable clips found.")
+        return
+
+    model = load_whisper()
+    print(f"   Device: {model.device} | Clips: {len(clips)}")
+    transcribe_batch(model, clips[:1], 1)  # warm-up
+
+    print(f"\n   {'batch':>5} | {'seconds':>8} | {'clips/sec':>9}")
+    for batch_size in batch_sizes:
+        if batch_size > len(clips): break
+        start = time.perf_counter()
+        try:
+            transcribe_batch(model, clips, batch_size)
+        except RuntimeError as e:
+            print(f"   {batch_size:>5} | ❌ {str(e).splitlines()[0][:60]}")
+            break
+        elapsed = time.perf_counter() - start
+        print(f"   {batch_size:>5} | {elapsed:>8.2f} | {len(clips) / elapsed:>9.2f}")
+        if torch.cuda.is_available(): torch.cuda.empty_cache()
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance between two transcripts (case and punctuation ignored)."""
+    ref = re.sub(r"[^\w\s']", " ", reference.lower()).split()
+    hyp = re.sub(r"[^\w\s']", " ", hypothesis.lower()).split()
+    row = np.arange(len(hyp) + 1)
+    for i, word in enumerate(ref, 1):
+        prev, row = row, np.empty_like(row)
+        row[0] = i
+        for j, other in enumerate(hyp, 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (word != other))
+    return int(row[-1]), len(ref)
+
+def load_heldout(metadata_path, max_clips, seed=0):
+    """A fixed random sample of (clip audio, reference text) from a metadata.csv."""
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        rows = [line.strip().split('|', 1) for line in f if '|' in line]
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(rows), size=min(max_clips, len(rows)), replace=False)
+    wavs_dir = os.path.join(os.path.dirname(metadata_path), "wavs")
+
+    clips, refs = [], []
+    for i in sorted(picked):
+        name, text = rows[i]
+        path = os.path.join(wavs_dir, name if name.endswith(".wav") else name + ".wav")
+        try:
+            y, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+        except Exception:
+            continue
+        clips.append(y)
+        refs.append(text)
+    return clips, refs
+
+def benchmark_models(metadata_path, max_clips=50):
+    """
+    Accuracy vs throughput of every Whisper size (plus int8 on CPU) on a held-out
+    sample of transcribed clips. WER is measured against the metadata transcripts,
+    so point it at a hand-checked metadata.csv for real accuracy numbers.
+    """
+    print(f"--- 📊 Whisper Model Benchmark ---")
+    if not os.path.exists(metadata_path):
+        print(f"❌ {metadata_path} not found. Slice some audio first or pass a metadata.csv.")
+        return
+    clips, refs = load_heldout(metadata_path, max_clips)
+    if not clips:
+        print("❌ No readable clips found.")
+        return
+    audio_seconds = sum(len(c) for c in clips) / SAMPLE_RATE
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    memory = available_memory_gb(device)
+    print(f"   Held-out set: {len(clips)} clips ({audio_seconds:.0f} s) from {metadata_path}")
+    print(f"   Device: {device}" + (f" | {memory:.1f} GB free" if memory else "") +
+          f" | auto choice: {' + '.join(map(str, choose_whisper(device)))}")
+
+    variants = [(name, False) for name in reversed(WHISPER_MEMORY_GB)]
+    if device == "cpu":
+        variants = [(name, q) for name in reversed(WHISPER_MEMORY_GB) for q in (False, True)]
+
+    print(f"\n   {'model':>8} | {'int8':>4} | {'load':>6} | {'clips/sec':>9} | {'RTF':>6} | {'WER':>6}")
+    for name, quantize in variants:
+        if memory and WHISPER_MEMORY_GB[name] > memory:
+            print(f"   {name:>8} | {'yes' if quantize else 'no':>4} | skipped, needs ~{WHISPER_MEMORY_GB[name]} GB")
+            continue
+        try:
+            start = time.perf_counter()
+            model = load_whisper(name, quantize)
+            load_time = time.perf_counter() - start
+            transcribe_batch(model, clips[:1], 1)  # warm-up
+
+            start = time.perf_counter()
+            texts = transcribe_batch(model, clips)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            print(f"   {name:>8} | {'yes' if quantize else 'no':>4} | ❌ {str(e).splitlines()[0][:60]}")
+            continue
+        finally:
+            model = None
+            if torch.cuda.is_available(): torch.cuda.empty_cache()
+
+        errors, words = map(sum, zip(*(word_errors(r, t) for r, t in zip(refs, texts))))
+        print(f"   {name:>8} | {'yes' if quantize else 'no':>4} | {load_time:>5.1f}s | {len(clips) / elapsed:>9.2f} | "
+              f"{elapsed / audio_seconds:>6.3f} | {100 * errors / max(words, 1):>5.1f}%")
+
+def write_synthetic_recording(path, hours, sr=44100):
+    """Speech-like noise bursts (0.5-12s) between short pauses, written a minute at a time."""
+    rng = np.random.default_rng(0)
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        for _ in range(int(hours * 60)):
+            minute = np.zeros(60 * sr, dtype=np.float32)
+            pos = int(rng.uniform(0.2, 1.0) * sr)
+            while pos < len(minute):
+                n = min(int(rng.uniform(0.5, 12.0) * sr), len(minute) - pos)
+                envelope = 0.5 + 0.5 * np.abs(np.sin(np.linspace(0, n / sr * 8, n)))
+                minute[pos:pos + n] = 0.1 * envelope * rng.standard_normal(n)
+                pos += n + int(rng.uniform(0.2, 1.0) * sr)
+            f.write(minute)
+
+def measure_segmentation(method, path):
+    """Runs in a fresh process: slices path one way, returns (seconds, clips, peak RSS in MB)."""
+    import resource
+    start = time.perf_counter()
+    clips = 0
+    if method == "librosa.load":
+        # The old slicer: whole file in memory, then split
+        y, sr = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+        intervals = librosa.effects.split(y, top_db=TOP_DB, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)
+        clips = sum(1 for a, b in intervals if 1.0 <= (b - a) / sr <= 10.0)
+    elif method == "streaming":
+        intervals, _ = plan_file(path)
+        clips = sum(1 for _ in iter_segments(path, intervals))
+    # ru_maxrss is in KB on Linux
+    return time.perf_counter() - start, clips, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def benchmark_memory(hours=3.0):
+    """Peak memory of the old whole-file slicer vs the streaming one on a synthetic long recording."""
+    print(f"--- 📊 Slicer Memory Benchmark ({hours:g} h synthetic recording) ---")
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.wav")
+        print("   Writing 44.1kHz mono test file...")
+        write_synthetic_recording(path, hours)
+        print(f"   File size: {os.path.getsize(path) / (1024 * 1024):.0f} MB")
+
+        print(f"\n   {'method':>12} | {'seconds':>8} | {'clips':>6} | {'peak RSS':>9} | {'over baseline':>13}")
+        baseline = None
+        for method in ("baseline", "streaming", "librosa.load"):
+            # Fresh process per method, peak RSS can't be reset within one.
+            # An out-of-memory kill surfaces as BrokenProcessPool instead of a hang.
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    seconds, clips, peak = pool.submit(measure_segmentation, method, path).result()
+            except Exception as e:
+                print(f"   {method:>12} | ❌ {str(e).splitlines()[0][:60]}")
+                continue
+            if baseline is None:
+                baseline = peak
+                print(f"   {method:>12} | {'-':>8} | {'-':>6} | {peak:>6.0f} MB | {'(imports only)':>13}")
+            else:
+                print(f"   {method:>12} | {seconds:>8.1f} | {clips:>6} | {peak:>6.0f} MB | {peak - baseline:>10.0f} MB")
+
+def benchmark_split(repeats=3):
+    """Speed and yield of the segmentation engine vs librosa.effects.split on the files in raw_audio/."""
+    print("--- 📊 Segmentation Benchmark ---")
+    raw_files = check_raw_files()
+    if not raw_files:
+        return
+
+    print(f"\n   {'file':>20} | {'audio':>7} | {'librosa':>8} | {'engine':>8} | {'speed-up':>8} | {'kept (filter)':>13} | {'kept (engine)':>13}")
+    for raw_file in raw_files:
+        # Decoded once up front: only the segmentation itself is timed
+        y = np.concatenate(list(stream_audio(raw_file)))
+        librosa.effects.split(y[:SAMPLE_RATE])  # warm-up (first call compiles)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            librosa.effects.split(y, top_db=TOP_DB, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)
+        t_librosa = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            power, n_samples = frame_power([y])
+            _, stats = plan_segments(power, n_samples)
+        t_engine = (time.perf_counter() - start) / repeats
+
+        speech = max(stats["speech"], 1e-9)
+        print(f"   {os.path.basename(raw_file)[:20]:>20} | {len(y) / SAMPLE_RATE / 60:>5.1f} m | {t_librosa:>7.3f}s | "
+              f"{t_engine:>7.3f}s | {t_librosa / t_engine:>7.1f}x | "
+              f"{stats['filtered']:>7.0f}s {100 * stats['filtered'] / speech:>3.0f}% | "
+              f"{stats['kept']:>7.0f}s {100 * stats['kept'] / speech:>3.0f}%")
+
 def main():
+    parser = argparse.ArgumentParser(description="Slice raw recordings and transcribe them with Whisper.")
+    parser.add_argument("--benchmark", action="store_true", help="measure clips/sec for several Whisper batch sizes")
+    parser.add_argument("--benchmark-memory", type=float, nargs="?", const=3.0, metavar="HOURS",
+                        help="compare slicer peak memory on a synthetic recording (default 3 hours)")
+    parser.add_argument("--benchmark-models", nargs="?", const=os.path.join(DATASET_DIR, "metadata.csv"),
+                        metavar="METADATA", help="accuracy vs speed of each Whisper size on held-out clips "
+                                                 "(default: dataset/metadata.csv)")
+    parser.add_argument("--benchmark-split", action="store_true",
+                        help="compare segmentation speed and kept audio with librosa.effects.split")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        return
+    if args.benchmark_models:
+        benchmark_models(args.benchmark_models)
+        return
+    if args.benchmark_split:
+        benchmark_split()
+        return
+    if args.benchmark_memory:
+        benchmark_memory(args.benchmark_memory)
+        return
+
     print(f"--- 🔪 Audio Slicer & Transcriber for '{VOICE_NAME}' ---")
-    
+
     # 1. Check Input
     raw_files = check_raw_files()
     if not raw_files:
@@ -34,77 +724,121 @@ def main():
     wavs_dir = os.path.join(DATASET_DIR, "wavs")
     if not os.path.exists(wavs_dir):
         os.makedirs(wavs_dir)
-    
-    metadata_path = os.path.join(DATASET_DIR, "metadata.csv")
 
-    # 3. Load Whisper
-    print("\n🧠 Loading Whisper Model (large)...")
-    # 'medium' is a good balance. Use 'large' if you have 12GB+ VRAM and want perfection.
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = whisper.load_model("large", device=device)
+    metadata_path = os.path.join(DATASET_DIR, "metadata.csv")
 
-    metadata_lines = []
-    global_count = 0
+    # 3. Compare against the manifest: only new, changed or unfinished files are processed
+    if not os.path.exists(MANIFEST_PATH) and os.path.exists(metadata_path):
+        # Dataset from a version without a manifest: start it over, as before
+        print(f"   ⚠️  No ingest manifest found. Moving old metadata.csv to metadata.csv.bak")
+        os.replace(metadata_path, metadata_path + ".bak")
 
-    # 4. Process Files
-    print(f"\n🚀 Processing {len(raw_files)} file(s)...")
-    
+    manifest, global_count = load_manifest()
+    file_hashes = {}
+    skip_starts = {}
+    todo = []
+    print(f"\n🔍 Checking {len(raw_files)} file(s) against the ingest manifest...")
     for raw_file in raw_files:
-        print(f"   Reading: {os.path.basename(raw_file)}")
-        
-        try:
-            # Load and Resample to 22050Hz Mono
-            y, sr = librosa.load(raw_file, sr=SAMPLE_RATE, mono=True)
-        except Exception as e:
-            print(f"   ⚠️  Skipping corrupt file: {e}")
-            continue
+        name = os.path.basename(raw_file)
+        file_hashes[raw_file] = hash_file(raw_file)
+        entry = manifest.get(name)
 
-        # Slice on silence (Top DB 40 is standard for clean speech)
-        intervals = librosa.effects.split(y, top_db=40, frame_length=2048, hop_length=512)
-        
-        print(f"   -> Found {len(intervals)} potential segments.")
-
-        for start, end in tqdm(intervals, desc="      Transcribing", leave=False):
-            chunk = y[start:end]
-            duration = len(chunk) / sr
-            
-            # Filter length (Piper hates < 1s and > 10s)
-            if duration < 1.0 or duration > 10.0:
+        if entry and entry["hash"] == file_hashes[raw_file]:
+            if entry["status"] == "done":
                 continue
-            
-            global_count += 1
-            
-            # Naming format: voice_name_0001.wav
-            filename = f"{VOICE_NAME}_{global_count:04d}.wav"
-            filepath = os.path.join(wavs_dir, filename)
-            
-            # Save as 16-bit PCM WAV (Crucial for Piper)
-            sf.write(filepath, chunk, SAMPLE_RATE, subtype='PCM_16')
-            
-            # Transcribe
-            result = model.transcribe(filepath, language="en")
-            text = result['text'].strip().replace("\n", " ")
-            
-            # Hallucination Filters
-            bad_starts = ["Subtitle", "Copyright", "Translated", "Captioning"]
-            if any(text.startswith(b) for b in bad_starts) or len(text) < 2:
-                os.remove(filepath) # Delete bad audio
-                global_count -= 1   # Reset count
-                continue
-                
-            # Add to metadata list
-            metadata_lines.append(f"{filename}|{text}")
+            # Interrupted last time: keep its clips, transcribe the rest
+            skip_starts[raw_file] = {c["start"] for c in entry["clips"]}
+            if entry["clips"]:
+                print(f"   ↪️  Resuming {name} ({len(entry['clips'])} clips already saved)")
+        elif entry and entry["clips"]:
+            print(f"   ♻️  {name} changed, replacing its {len(entry['clips'])} clips")
+            remove_clips(entry["clips"], wavs_dir, metadata_path)
+            with open_append(MANIFEST_PATH) as f:
+                log_event(f, event="file", file=name, hash=entry["hash"], status="removed")
+        todo.append(raw_file)
+
+    if not todo:
+        print("✅ Nothing new to ingest. Add or change files in raw_audio/ to extend the dataset.")
+        return
+
+    # 4. Start decoding (overlaps the Whisper load below)
+    workers = SLICER_WORKERS if SLICER_WORKERS > 0 else (os.cpu_count() or 1)
+    workers = min(workers, len(todo))
+    print(f"\n🚀 Processing {len(todo)} file(s) with {workers} decode worker(s)...")
+
+    # Spawn, not fork: the parent may already hold a CUDA context
+    ctx = multiprocessing.get_context("spawn")
+    manager = ctx.Manager()
+    segment_queue = manager.Queue(maxsize=SEGMENT_QUEUE_SIZE)
+    write_queue = queue.Queue(maxsize=SEGMENT_QUEUE_SIZE)
+    with open_append(MANIFEST_PATH) as f:
+        for raw_file in todo:
+            log_event(f, event="file", file=os.path.basename(raw_file), hash=file_hashes[raw_file], status="started")
+    writer_errors = []
+    writer = threading.Thread(target=writer_thread, args=(write_queue, wavs_dir, metadata_path, writer_errors))
+    writer.start()
+
+    pending_files = set(todo)
+    progress = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = {pool.submit(decode_worker, raw_file, segment_queue, skip_starts.get(raw_file, set())): raw_file
+                       for raw_file in todo}
+            try:
+                # 5. Load Whisper
+                model = load_whisper()
+                progress = tqdm(desc="      Transcribing", unit="clip", leave=False)
+
+                while pending_files:
+                    if writer_errors:
+                        raise writer_errors[0]
+                    batch, finished = next_batch(segment_queue, WHISPER_BATCH_SIZE, pending_files)
+                    if not batch and not finished:
+                        # A worker that crashed never reports "done"
+                        for future, raw_file in futures.items():
+                            if future.done() and future.exception() and raw_file in pending_files:
+                                pending_files.discard(raw_file)
+                                print(f"\n   ⚠️  Decoder crashed on {os.path.basename(raw_file)}: {future.exception()}")
+                        continue
+
+                    # Transcribe straight from memory, one forward pass per batch
+                    texts = transcribe_batch(model, [chunk for _, (_, _, chunk) in batch]) if batch else []
+                    progress.update(len(batch))
+
+                    for (raw_file, (start, end, chunk)), text in zip(batch, texts):
+                        if is_hallucination(text):
+                            continue
+
+                        # Naming format: voice_name_0001.wav
+                        filename = f"{VOICE_NAME}_{global_count:04d}.wav"
+                        global_count += 1
+                        write_queue.put(("clip", raw_file, filename, start, end, chunk, text))
+
+                    # Queued after the file's last clips, so "done" is only logged once they are on disk
+                    for raw_file, status, detail in finished:
+                        write_queue.put(("file", raw_file, file_hashes[raw_file], status, detail))
+            except BaseException:
+                # Workers may be blocked on the full segment queue, and leaving the
+                # pool waits for them: cancel what hasn't started and close the queue
+                pool.shutdown(wait=False, cancel_futures=True)
+                manager.shutdown()
+                raise
+    finally:
+        if progress is not None: progress.close()
+        write_queue.put(None)
+        writer.join()
+        manager.shutdown()
+    if writer_errors:
+        raise writer_errors[0]
 
-    # 5. Write Metadata
-    print(f"\n💾 Saving {metadata_path}...")
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(metadata_lines))
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        total = sum(1 for line in f if line.strip())
 
     print(f"\n--- ✅ Dataset Ready ---")
-    print(f"Total Clips: {len(metadata_lines)}")
+    print(f"Total Clips: {total}")
     print(f"Location: {DATASET_DIR}/")
     print("Action: Check metadata.csv quickly to ensure text looks correct.")
     print("Next Step: Run Script 4 to prepare training tensors.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
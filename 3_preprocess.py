@@ -1,9 +1,228 @@
 import os
 import sys
+import json
+import time
+import hashlib
+import shutil
+import argparse
 import subprocess
 from config import *
 
+# Shards live here while they run; merged output goes to TRAINING_DIR as before
+SHARDS_DIR = os.path.join(TRAINING_DIR, "shards")
+# What each utterance in dataset.jsonl was built from, to skip unchanged ones next time
+STATE_PATH = os.path.join(TRAINING_DIR, "preprocess_state.json")
+CACHE_DIR = os.path.join(TRAINING_DIR, "cache", str(SAMPLE_RATE))
+
+def get_shard_count(requested=None):
+    """--shards, else PREPROCESS_SHARDS, else one shard per 2 cores (max 8)."""
+    shards = requested or PREPROCESS_SHARDS
+    if shards <= 0:
+        shards = min(max((os.cpu_count() or 1) // 2, 1), 8)
+    return shards
+
+def read_metadata_lines(metadata_path):
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+def absolute_wav_path(filename):
+    """
+    The path piper caches a clip under (sha256 of its absolute path). Shard
+    metadata points at the same files, so tensors are shared with unsharded runs.
+    """
+    path = os.path.join(DATASET_DIR, "wavs", filename)
+    if not os.path.exists(path) and not filename.endswith(".wav"):
+        path += ".wav"
+    return os.path.abspath(path)
+
+# --- CHANGE DETECTION ---
+
+def load_state():
+    try:
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_state(state):
+    # Write then rename, so an interrupted run never leaves a corrupt state file
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_PATH)
+
+def hash_wav(path, old):
+    """sha256 of a wav, reusing the old one while size and mtime are unchanged."""
+    stat = os.stat(path)
+    if old and old.get("size") == stat.st_size and old.get("mtime_ns") == stat.st_mtime_ns:
+        return old["wav"]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def utterance_key(wav_hash, text):
+    """Everything an utterance's phoneme ids and tensors depend on."""
+    return hashlib.sha256(f"{wav_hash}|{text}|{LANGUAGE_CODE}|{SAMPLE_RATE}".encode('utf-8')).hexdigest()
+
+def load_dataset_lines(path):
+    """{absolute wav path: dataset.jsonl line} of an existing dataset.jsonl."""
+    lines = {}
+    if not os.path.exists(path):
+        return lines
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip(): continue
+            utt = json.loads(line)
+            lines[os.path.abspath(utt["audio_path"])] = (line.rstrip("\n"), utt)
+    return lines
+
+def plan_work(lines, full=False):
+    """
+    Compares metadata.csv with the last run. Returns (todo lines, reused
+    dataset.jsonl lines by wav path, new state). Stale tensors of changed WAVs
+    are deleted, since piper would otherwise reuse them (it caches by path).
+    """
+    old_state = {} if full else load_state().get("utterances", {})
+    previous = {} if full else load_dataset_lines(os.path.join(TRAINING_DIR, "dataset.jsonl"))
+    todo, reused, state = [], {}, {}
+
+    for line in lines:
+        filename, _, text = line.partition('|')
+        path = absolute_wav_path(filename)
+        if not os.path.exists(path):
+            todo.append(line)  # let piper report it
+            continue
+        old = old_state.get(path)
+        stat = os.stat(path)
+        wav_hash = hash_wav(path, old)
+        key = utterance_key(wav_hash, text)
+        state[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "wav": wav_hash, "key": key}
+
+        entry = previous.get(path)
+        tensors_ok = entry and all(os.path.exists(entry[1].get(k) or "") for k in ("audio_norm_path", "audio_spec_path"))
+        if old and old["key"] == key and tensors_ok:
+            reused[path] = entry[0]
+            continue
+
+        todo.append(line)
+        if not old or old["wav"] != wav_hash:
+            # New audio (or unknown history): its cached tensors can't be trusted
+            cache_id = hashlib.sha256(path.encode('utf-8')).hexdigest()
+            for name in (f"{cache_id}.pt", f"{cache_id}.spec.pt"):
+                if os.path.exists(os.path.join(CACHE_DIR, name)):
+                    os.remove(os.path.join(CACHE_DIR, name))
+    return todo, reused, state
+
+# --- SHARDS ---
+
+def write_shards(lines, shards):
+    """Splits metadata lines into contiguous shards. Returns {shard dir: clip count}."""
+    if os.path.exists(SHARDS_DIR):
+        shutil.rmtree(SHARDS_DIR)
+
+    shard_dirs = {}
+    size = -(-len(lines) // shards)
+    for i in range(shards):
+        part = lines[i * size:(i + 1) * size]
+        if not part: break
+        shard_dir = os.path.join(SHARDS_DIR, f"shard_{i:02d}")
+        os.makedirs(shard_dir)
+        with open(os.path.join(shard_dir, "metadata.csv"), 'w', encoding='utf-8') as f:
+            for line in part:
+                filename, _, text = line.partition('|')
+                f.write(f"{absolute_wav_path(filename)}|{text}\n")
+        shard_dirs[shard_dir] = len(part)
+    return shard_dirs
+
+def build_command(shard_dir, workers):
+    # python -m piper_train.preprocess ...
+    return [
+        sys.executable, "-m", "piper_train.preprocess",
+        "--language", LANGUAGE_CODE,
+        "--input-dir", shard_dir,
+        "--output-dir", shard_dir,
+        "--dataset-format", "ljspeech",
+        "--single-speaker",
+        "--sample-rate", str(SAMPLE_RATE),
+        # All shards share one tensor cache, where an unsharded run would put it
+        "--cache-dir", CACHE_DIR,
+        "--max-workers", str(workers)
+    ]
+
+def run_shards(shard_dirs, env):
+    """Runs one piper preprocess per shard in parallel. Returns {shard_dir: seconds}, or None on failure."""
+    workers = max((os.cpu_count() or 1) // len(shard_dirs), 1)
+    print(f"   Shards: {len(shard_dirs)} x {workers} worker(s)")
+
+    running = {}
+    for shard_dir in shard_dirs:
+        log = open(os.path.join(shard_dir, "preprocess.log"), 'w')
+        proc = subprocess.Popen(build_command(shard_dir, workers), env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        running[shard_dir] = (proc, log, time.perf_counter())
+
+    timings = {}
+    failed = []
+    while running:
+        for shard_dir, (proc, log, start) in list(running.items()):
+            if proc.poll() is None: continue
+            log.close()
+            del running[shard_dir]
+            timings[shard_dir] = time.perf_counter() - start
+            if proc.returncode != 0:
+                failed.append(shard_dir)
+            else:
+                print(f"   ✔️  {os.path.basename(shard_dir)} done in {timings[shard_dir]:.1f}s")
+        time.sleep(0.2)
+
+    for shard_dir in failed:
+        print(f"\n❌ {os.path.basename(shard_dir)} failed. Last lines of its log:")
+        with open(os.path.join(shard_dir, "preprocess.log"), 'r', errors='replace') as f:
+            print("".join(f.readlines()[-10:]))
+    return None if failed else timings
+
+def merge_shards(shard_dirs, lines, reused):
+    """
+    Rewrites dataset.jsonl in metadata.csv order (piper writes utterances in
+    whatever order its workers finish) from the shards' new utterances and the
+    reused ones, and installs config.json.
+    """
+    fresh = {}
+    for shard_dir in shard_dirs:
+        fresh.update({path: line for path, (line, _) in
+                      load_dataset_lines(os.path.join(shard_dir, "dataset.jsonl")).items()})
+
+    utterances = []
+    for line in lines:
+        path = absolute_wav_path(line.partition('|')[0])
+        utt = fresh.get(path) or reused.get(path)
+        if utt: utterances.append(utt)
+
+    # Write then rename, so an interrupted merge never leaves a half dataset
+    dataset_path = os.path.join(TRAINING_DIR, "dataset.jsonl")
+    with open(dataset_path + ".tmp", 'w', encoding='utf-8') as f:
+        f.write("".join(line + "\n" for line in utterances))
+    os.replace(dataset_path + ".tmp", dataset_path)
+
+    if shard_dirs:
+        # Single speaker: every shard writes the same config, bar the dataset name
+        # (piper names it after the output dir's parent)
+        with open(os.path.join(shard_dirs[0], "config.json"), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if "dataset" in config:
+            config["dataset"] = os.path.basename(os.path.dirname(os.path.normpath(TRAINING_DIR)))
+        with open(os.path.join(TRAINING_DIR, "config.json"), 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=4)
+    return len(utterances)
+
 def main():
+    parser = argparse.ArgumentParser(description="Turn dataset/ into Piper training tensors.")
+    parser.add_argument("--shards", type=int, help="parallel piper preprocess runs (default: PREPROCESS_SHARDS)")
+    parser.add_argument("--full", action="store_true", help="rebuild every utterance, not just new or changed ones")
+    args = parser.parse_args()
+
     print(f"--- ⚙️  Preprocessing Data for '{VOICE_NAME}' ---")
 
     # 1. Setup Python Path
@@ -21,31 +240,55 @@ def main():
     print(f"   Output: {TRAINING_DIR}/")
     print(f"   Specs:  {LANGUAGE_CODE} | {SAMPLE_RATE}Hz")
 
-    # 2. Build Command
-    # python -m piper_train.preprocess ...
-    cmd = [
-        sys.executable, "-m", "piper_train.preprocess",
-        "--language", LANGUAGE_CODE,
-        "--input-dir", DATASET_DIR,
-        "--output-dir", TRAINING_DIR,
-        "--dataset-format", "ljspeech",
-        "--single-speaker",
-        "--sample-rate", str(SAMPLE_RATE)
-    ]
+    metadata_path = os.path.join(DATASET_DIR, "metadata.csv")
+    if not os.path.exists(metadata_path):
+        print(f"❌ Error: {metadata_path} not found. Run Script 2 first.")
+        return
+    lines = read_metadata_lines(metadata_path)
+    start = time.perf_counter()
+    os.makedirs(CACHE_DIR, exist_ok=True)
 
-    # 3. Run
-    try:
-        subprocess.run(cmd, check=True, env=env)
-        
-        print("\n--- ✅ Preprocessing Complete ---")
-        print(f"Folder '{TRAINING_DIR}/' is now populated with:")
-        print("  - config.json")
-        print("  - dataset.jsonl")
-        print("  - tensors (.pt files)")
-        print("\nNext Step: Run Script 4 to START TRAINING.")
-
-    except subprocess.CalledProcessError as e:
-        print(f"\n❌ Preprocessing Failed: {e}")
+    # 2. Find new or changed utterances (wav hash, text, language, sample rate)
+    todo, reused, state = plan_work(lines, args.full)
+    print(f"   Clips:  {len(lines)} | {len(reused)} unchanged, {len(todo)} to (re)build")
+
+    # 3. Run piper on those, in parallel shards
+    timings, shard_clips = {}, {}
+    if todo:
+        shards = min(get_shard_count(args.shards), len(todo))
+        shard_clips = write_shards(todo, shards)
+        timings = run_shards(list(shard_clips), env)
+        if timings is None:
+            print("\n❌ Preprocessing Failed.")
+            return
+    elif os.path.exists(os.path.join(TRAINING_DIR, "config.json")):
+        print("\n✅ Nothing changed since the last run.")
+
+    # 4. Merge
+    merge_start = time.perf_counter()
+    count = merge_shards(sorted(timings), lines, reused)
+    merge_time = time.perf_counter() - merge_start
+    save_state({"language": LANGUAGE_CODE, "sample_rate": SAMPLE_RATE, "utterances": state})
+    if os.path.exists(SHARDS_DIR):
+        shutil.rmtree(SHARDS_DIR)
+
+    print(f"\n--- ⏱️  Timing Report ---")
+    if timings:
+        print(f"   {'shard':>8} | {'clips':>6} | {'seconds':>8} | {'clips/sec':>9}")
+        for shard_dir in sorted(timings):
+            clips = shard_clips[shard_dir]
+            print(f"   {os.path.basename(shard_dir):>8} | {clips:>6} | {timings[shard_dir]:>8.1f} | {clips / timings[shard_dir]:>9.1f}")
+    print(f"   Merge:  {merge_time:.2f}s ({count} utterances, {len(reused)} reused)")
+    wall = time.perf_counter() - start
+    print(f"   Total:  {wall:.1f}s wall, {len(todo)} clip(s) rebuilt"
+          + (f", {len(todo) / wall:.1f} clips/sec, {sum(timings.values()) / wall:.1f} shards busy on average" if timings else ""))
+
+    print("\n--- ✅ Preprocessing Complete ---")
+    print(f"Folder '{TRAINING_DIR}/' is now populated with:")
+    print("  - config.json")
+    print("  - dataset.jsonl")
+    print("  - tensors (.pt files)")
+    print("\nNext Step: Run Script 4 to START TRAINING.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,8 +1,44 @@
 import os
 import sys
 import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
 import subprocess
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from pytorch_lightning import Callback
 from config import *
+from length_buckets import LengthBucketSampler
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False  # Windows: CPU memory isn't measured
+
+# Set for the piper_train process this script launches (see run_piper)
+LAUNCH_OPTIONS_ENV = "PIPER_FORGE_TRAIN_OPTIONS"
+# piper's spectrogram hop, to turn audio samples into frames
+HOP_LENGTH = 256
+# The hardware config picked by the throughput probe, kept next to the checkpoints
+HARDWARE_PATH = os.path.join(TRAINING_DIR, "train_hardware.json")
+# Probe runs: untimed warm-up steps, then timed steps, per candidate config
+PROBE_WARMUP_STEPS = 5
+PROBE_STEPS = 20
+PROBE_TIMEOUT_SECONDS = 900
+# Batch size finder: largest batch tried, and device memory left free for longer runs
+MAX_TUNED_BATCH_SIZE = 256
+BATCH_HEADROOM = 0.15
+BATCH_TUNE_PATH = os.path.join(TRAINING_DIR, "train_batch_sizes.json")
+# One JSON record per training step/epoch/checkpoint, appended across runs
+TELEMETRY_PATH = os.path.join(TRAINING_DIR, "telemetry.jsonl")
+# Steps the summary compares against the whole run, and what counts as a stall
+SUMMARY_RECENT_STEPS = 200
+STALL_FACTOR = 3
 
 def get_resume_checkpoint():
     """Decides whether to start fresh or resume."""
@@ -25,11 +61,528 @@ def get_resume_checkpoint():
     print(f"❌ Error: No base model found at {BASE_MODEL_FILENAME}")
     sys.exit(1)
 
+# --- LENGTH BUCKETING ---
+
+def utterance_length(utterance, mode):
+    """Phoneme count, or spectrogram frames estimated from the audio tensor's file size."""
+    if mode == "tokens":
+        return len(utterance.phoneme_ids)
+    frames = os.path.getsize(utterance.audio_norm_path) // 4 // HOP_LENGTH  # float32 samples
+    # Round to ~0.1s so clips of about the same length get shuffled between batches
+    return -(-frames // 8) * 8
+
+def bucketed_loader(model, loader, mode, budget):
+    """piper's train DataLoader, rebuilt around a LengthBucketSampler."""
+    subset = model._train_dataset
+    dataset = getattr(subset, "dataset", subset)
+    indices = getattr(subset, "indices", range(len(subset)))
+    lengths = [utterance_length(dataset.utterances[i], mode) for i in indices]
+    if not budget:
+        # Same number of steps per epoch as fixed batches of BATCH_SIZE
+        budget = int(model.hparams.batch_size * sum(lengths) / len(lengths))
+    trainer = model.trainer
+    sampler = LengthBucketSampler(lengths, budget, rank=getattr(trainer, "global_rank", 0),
+                                  replicas=getattr(trainer, "world_size", 1))
+    if getattr(trainer, "is_global_zero", True):
+        sizes = [len(b) for b in sampler.plan(0)]
+        print(f"📦 Length buckets ({mode}): {budget} per batch, "
+              f"{len(sizes)} batches of {min(sizes)}-{max(sizes)} clips")
+    return DataLoader(subset, batch_sampler=sampler, collate_fn=loader.collate_fn,
+                      num_workers=loader.num_workers, pin_memory=loader.pin_memory)
+
+def stressed_loader(model, loader):
+    """
+    `loader`, starting with the batches that need the most memory: the one
+    with the longest clip and the fullest one (bucketed), or the longest
+    clips together (fixed size batches, which can hold any clips).
+    """
+    subset = model._train_dataset
+    dataset = getattr(subset, "dataset", subset)
+    indices = getattr(subset, "indices", range(len(subset)))
+    frames = [utterance_length(dataset.utterances[i], "frames") for i in indices]
+
+    if isinstance(loader.batch_sampler, LengthBucketSampler):
+        batches = loader.batch_sampler.plan(0)
+        worst = [max(batches, key=lambda b: max(frames[i] for i in b)), max(batches, key=len)]
+    else:
+        batches = list(loader.batch_sampler)
+        longest = sorted(range(len(frames)), key=frames.__getitem__, reverse=True)
+        worst = [longest[:max(len(b) for b in batches)]]
+    return DataLoader(subset, batch_sampler=worst + batches, collate_fn=loader.collate_fn,
+                      num_workers=loader.num_workers, pin_memory=loader.pin_memory)
+
+# --- PROFILING ---
+
+class LoaderProfile(Callback):
+    """Prints padding, samples/sec and time spent waiting for batches after each epoch."""
+    def __init__(self):
+        self.epochs = []
+        self.current = None
+
+    def on_train_epoch_start(self, trainer, pl_module):
+        self.last_end = time.perf_counter()
+        self.current = {"epoch": trainer.current_epoch, "start": self.last_end, "samples": 0, "wait": 0.0,
+                        "frames": 0, "padded_frames": 0, "tokens": 0, "padded_tokens": 0}
+
+    def on_train_batch_start(self, trainer, pl_module, batch, batch_idx, *args):
+        stats = self.current
+        stats["wait"] += time.perf_counter() - self.last_end
+        frames = getattr(batch, "spectrogram_lengths", None)
+        tokens = getattr(batch, "phoneme_lengths", None)
+        if frames is None or tokens is None: return
+        stats["samples"] += len(frames) * trainer.world_size  # roughly, other devices get similar batches
+        stats["frames"] += int(frames.sum())
+        stats["padded_frames"] += len(frames) * batch.spectrograms.shape[-1]
+        stats["tokens"] += int(tokens.sum())
+        stats["padded_tokens"] += len(tokens) * batch.phoneme_ids.shape[-1]
+
+    def on_train_batch_end(self, trainer, pl_module, *args):
+        self.last_end = time.perf_counter()
+
+    def on_train_epoch_end(self, trainer, pl_module):
+        self.finish_epoch(trainer)
+
+    def on_train_end(self, trainer, pl_module):
+        # max_steps can stop training mid-epoch
+        self.finish_epoch(trainer)
+        if not trainer.is_global_zero or not self.epochs: return
+        seconds = sum(e["seconds"] for e in self.epochs)
+        samples = sum(e["samples"] for e in self.epochs)
+        wait = sum(e["wait"] for e in self.epochs)
+        print(f"\n--- 📊 Dataloader Profile ({len(self.epochs)} epoch(s)) ---")
+        print(f"   {samples / seconds:.1f} samples/sec, waited {wait:.1f}s for data ({wait / seconds:.0%} of the time)")
+
+    def finish_epoch(self, trainer):
+        stats, self.current = self.current, None
+        if not stats or not stats["samples"]: return
+        stats["seconds"] = time.perf_counter() - stats["start"]
+        self.epochs.append(stats)
+        if trainer.is_global_zero:
+            print(f"\n📊 Epoch {stats['epoch']}: {stats['samples'] / stats['seconds']:.1f} samples/sec | "
+                  f"padding {1 - stats['frames'] / stats['padded_frames']:.0%} frames, "
+                  f"{1 - stats['tokens'] / stats['padded_tokens']:.0%} tokens | "
+                  f"waiting for data {stats['wait']:.1f}s ({stats['wait'] / stats['seconds']:.0%})")
+
+class ThroughputProbe(Callback):
+    """Times a few training steps, writes samples/sec to `path`, then stops training."""
+    def __init__(self, path, warmup=PROBE_WARMUP_STEPS, steps=PROBE_STEPS):
+        self.path = path
+        self.warmup = warmup
+        self.steps = steps
+        self.seen = 0
+        self.samples = 0
+        self.finite = True
+
+    def on_train_batch_start(self, trainer, pl_module, batch, batch_idx, *args):
+        if self.seen == self.warmup:
+            self.start = time.perf_counter()
+        if self.seen >= self.warmup:
+            self.samples += len(batch.spectrogram_lengths)
+
+    def on_train_batch_end(self, trainer, pl_module, *args):
+        self.seen += 1
+        # fp16 can overflow into NaN losses, which makes a config unusable however fast it is
+        for value in trainer.callback_metrics.values():
+            if isinstance(value, torch.Tensor) and not torch.isfinite(value).all():
+                self.finite = False
+        if self.seen < self.warmup + self.steps: return
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        seconds = time.perf_counter() - self.start
+        if trainer.is_global_zero:
+            peak, total = peak_memory_gb(pl_module)
+            with open(self.path, 'w') as f:
+                json.dump({"samples_per_sec": self.samples * trainer.world_size / seconds, "finite": self.finite,
+                           "peak_memory_gb": peak, "total_memory_gb": total}, f)
+        trainer.should_stop = True
+
+def peak_memory_gb(model):
+    """(peak, total) memory in GB of the device training `model` on, or (None, None)."""
+    if model.device.type == "cuda":
+        return (torch.cuda.max_memory_reserved(model.device) / 1e9,
+                torch.cuda.get_device_properties(model.device).total_memory / 1e9)
+    if HAS_RESOURCE:
+        # ru_maxrss is in KB on Linux
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6,
+                os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e9)
+    return None, None
+
+class Telemetry(Callback):
+    """
+    Appends a JSON record per training step (step time, data wait, samples/sec,
+    losses, memory), per epoch and per checkpoint write to TELEMETRY_PATH.
+    """
+    def __init__(self, path, run):
+        self.path = path
+        self.run = run
+        self.file = None
+
+    def write(self, trainer, event, **fields):
+        if self.file is None or not trainer.is_global_zero: return
+        record = {"event": event, "time": round(time.time(), 3), "epoch": trainer.current_epoch,
+                  "step": trainer.global_step}
+        record.update(fields)
+        self.file.write(json.dumps(record) + "\n")
+
+    def on_train_start(self, trainer, pl_module):
+        if trainer.is_global_zero:
+            # Line buffered, so a crash loses at most the current line
+            self.file = open(self.path, 'a', buffering=1, encoding='utf-8')
+        self.write(trainer, "start", **self.run)
+
+    def on_train_epoch_start(self, trainer, pl_module):
+        self.epoch_start = self.last_end = time.perf_counter()
+        self.epoch_samples = 0
+
+    def on_train_batch_start(self, trainer, pl_module, batch, batch_idx, *args):
+        self.batch_start = time.perf_counter()
+        self.samples = len(batch.spectrogram_lengths) * trainer.world_size
+
+    def on_train_batch_end(self, trainer, pl_module, *args):
+        now = time.perf_counter()
+        step_time = now - self.last_end
+        self.last_end = now
+        self.epoch_samples += self.samples
+        losses = {name: float(value) for name, value in trainer.callback_metrics.items()
+                  if name.startswith("loss") and isinstance(value, torch.Tensor) and value.numel() == 1}
+        memory = peak_memory_gb(pl_module)[0]
+        self.write(trainer, "step", step_time=round(step_time, 4),
+                   data_wait=round(self.batch_start - (now - step_time), 4),
+                   samples=self.samples, samples_per_sec=round(self.samples / step_time, 2),
+                   losses=losses, memory_gb=None if memory is None else round(memory, 3))
+
+    def on_train_epoch_end(self, trainer, pl_module):
+        seconds = time.perf_counter() - self.epoch_start
+        self.write(trainer, "epoch", seconds=round(seconds, 2), samples=self.epoch_samples)
+
+    def on_checkpoint_written(self, trainer, path, seconds):
+        self.write(trainer, "checkpoint", path=os.path.basename(path), seconds=round(seconds, 3))
+
+    def on_train_end(self, trainer, pl_module):
+        self.write(trainer, "end")
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def read_telemetry(path=TELEMETRY_PATH):
+    """The records of the latest run in the telemetry file, and how many runs it holds."""
+    runs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line of a killed run
+            if record["event"] == "start" or not runs:
+                runs.append([])
+            runs[-1].append(record)
+    return (runs[-1] if runs else []), len(runs)
+
+def summarize_telemetry(path=TELEMETRY_PATH):
+    """Prints throughput, stalls, data waits, memory, checkpoint writes and loss trends of the latest run."""
+    records, run_count = read_telemetry(path) if os.path.exists(path) else ([], 0)
+    if not records:
+        print(f"❌ No telemetry yet ({path}). Train with Script 4 first.")
+        return
+    steps = [r for r in records if r["event"] == "step"]
+    checkpoints = [r for r in records if r["event"] == "checkpoint"]
+    start = records[0]
+    print(f"--- 📈 Training Telemetry ({run_count} run(s), showing the latest) ---")
+    if start["event"] == "start":
+        print(f"   Started:     {time.strftime('%Y-%m-%d %H:%M', time.localtime(start['time']))}"
+              f" | {start.get('hardware', '?')} | batch {start.get('batch_size', '?')} ({start.get('bucket', '?')})")
+    if not steps:
+        print("   No training steps recorded yet.")
+        return
+
+    step_times = np.array([r["step_time"] for r in steps])
+    rates = np.array([r["samples_per_sec"] for r in steps])
+    waits = np.array([r["data_wait"] for r in steps])
+    recent = rates[-SUMMARY_RECENT_STEPS:]
+    median = np.median(step_times)
+    stalls = np.flatnonzero(step_times > STALL_FACTOR * median)
+    change = np.median(recent) / np.median(rates) - 1
+
+    print(f"   Steps:       {steps[0]['step']}-{steps[-1]['step']} (epochs {steps[0]['epoch']}-{steps[-1]['epoch']})"
+          + (" | still running or killed" if records[-1]["event"] != "end" else ""))
+    print(f"   Throughput:  {np.median(rates):.1f} samples/sec median | last {len(recent)} steps: "
+          f"{np.median(recent):.1f} ({change:+.0%})" + ("  ⚠️  slower" if change < -0.1 else ""))
+    print(f"   Step time:   {median:.3f}s median, {np.percentile(step_times, 95):.3f}s p95"
+          + (f" | {len(stalls)} stall(s) > {STALL_FACTOR}x median, worst {step_times[stalls].max():.2f}s"
+             f" at step {steps[int(stalls[np.argmax(step_times[stalls])])]['step']}" if len(stalls) else ""))
+    print(f"   Data wait:   {waits.sum() / step_times.sum():.0%} of step time, {waits.max():.2f}s worst")
+    memory = [r["memory_gb"] for r in steps if r.get("memory_gb") is not None]
+    if memory:
+        print(f"   Memory:      {max(memory):.2f} GB peak")
+    if checkpoints:
+        seconds = [r["seconds"] for r in checkpoints]
+        print(f"   Checkpoints: {len(seconds)} written, {np.mean(seconds):.2f}s avg, {max(seconds):.2f}s max")
+    names = sorted(steps[-1]["losses"])
+    width = max([len(name) + 2 for name in names] + [13])
+    for name in names:
+        values = [r["losses"][name] for r in steps if name in r["losses"]]
+        window = min(SUMMARY_RECENT_STEPS, max(len(values) // 2, 1))
+        print(f"   {name + ':':<{width}}{np.mean(values[:window]):.3f} → {np.mean(values[-window:]):.3f}"
+              f" (mean of first/last {window} steps)")
+
+# --- HARDWARE ---
+
+def hardware_signature(batch_size):
+    """What the probe result depends on; a new signature means probing again."""
+    return {
+        "torch": torch.__version__,
+        "cpus": os.cpu_count(),
+        "gpus": [torch.cuda.get_device_name(i) for i in range(torch.cuda.device_count())],
+        "batch_size": batch_size,
+        "quality": QUALITY,
+    }
+
+def hardware_candidates(accelerator="auto", devices=0, precision="auto"):
+    """Configs worth trying here: every device of the accelerator, each precision it supports."""
+    gpus = torch.cuda.device_count()
+    if accelerator == "auto":
+        accelerator = "gpu" if gpus else "cpu"
+
+    if accelerator == "gpu":
+        devices = min(devices or gpus, gpus) or 1
+        precisions = ["32", "16"]
+        if gpus and torch.cuda.is_bf16_supported():
+            precisions.append("bf16")
+    else:
+        # One process already uses every core; bf16 autocast pays off on CPUs with bf16 units
+        devices = 1
+        precisions = ["32", "bf16"]
+    if precision != "auto":
+        precisions = [precision]
+
+    return [{"accelerator": accelerator, "devices": devices, "precision": p,
+             "strategy": "ddp" if devices > 1 else None} for p in precisions]
+
+def describe_hardware(hardware):
+    return f"{hardware['accelerator']} x{hardware['devices']}, precision {hardware['precision']}" + \
+           (f", {hardware['strategy']}" if hardware["strategy"] else "")
+
+def run_probe(hardware, env, resume_ckpt, bucket, batch_size, **options):
+    """Trains a few steps in a scratch dir. Returns the ThroughputProbe result, or why there is none."""
+    probe_dir = tempfile.mkdtemp(prefix="probe_", dir=TRAINING_DIR)
+    result_path = os.path.join(probe_dir, "probe.json")
+    launch_options = json.loads(env[LAUNCH_OPTIONS_ENV])
+    launch_options.update(options, profile=False, probe=result_path)
+    probe_env = dict(env)
+    probe_env[LAUNCH_OPTIONS_ENV] = json.dumps(launch_options)
+    cmd = build_command(resume_ckpt, hardware, MAX_EPOCHS, bucket, batch_size) + [
+        "--default_root_dir", probe_dir,
+        "--num_sanity_val_steps", "0",
+        "--limit_val_batches", "0",
+    ]
+
+    result = {"samples_per_sec": 0.0, "finite": False}
+    try:
+        proc = subprocess.run(cmd, env=probe_env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              text=True, timeout=PROBE_TIMEOUT_SECONDS)
+        if os.path.exists(result_path):
+            with open(result_path, 'r') as f:
+                result = json.load(f)
+        elif proc.returncode != 0:
+            last_line = (proc.stderr.strip().splitlines() or ["crashed"])[-1]
+            result["error"] = "out of memory" if "out of memory" in proc.stderr.lower() else last_line
+    except subprocess.TimeoutExpired:
+        result["error"] = "timed out"
+    finally:
+        shutil.rmtree(probe_dir, ignore_errors=True)
+    return result
+
+def probe_status(result):
+    if result["finite"] and result["samples_per_sec"]:
+        return f"{result['samples_per_sec']:.1f} samples/sec"
+    return result.get("error", "NaN loss" if result["samples_per_sec"] else "no result")
+
+def probe_hardware(candidates, env, resume_ckpt, bucket, batch_size):
+    """Runs a few training steps with each candidate. Returns the candidates with their samples/sec."""
+    print(f"\n🔬 Probing {len(candidates)} hardware configs ({PROBE_STEPS} steps each)...")
+    results = []
+    for hardware in candidates:
+        result = run_probe(hardware, env, resume_ckpt, bucket, batch_size)
+        results.append(dict(hardware, **result))
+        print(f"   {describe_hardware(hardware):<28} {probe_status(result)}")
+    return results
+
+def choose_hardware(args, env, resume_ckpt):
+    """
+    Picks accelerator/devices/precision: the config saved by the last probe on
+    this machine, else the fastest config of a new probe with finite losses.
+    The choice is saved next to the checkpoints.
+    """
+    candidates = hardware_candidates(args.accelerator, args.devices, args.precision)
+    signature = hardware_signature(args.batch_size)
+    if os.path.exists(HARDWARE_PATH) and not args.probe and len(candidates) > 1:
+        with open(HARDWARE_PATH, 'r') as f:
+            saved = json.load(f)
+        if saved.get("signature") == signature and saved.get("candidates") == candidates:
+            print(f"\n♻️  Using the hardware config probed at {saved['chosen_at']} (--probe to redo)")
+            return saved["choice"]
+
+    results = []
+    choice = candidates[0]
+    if len(candidates) > 1:
+        results = probe_hardware(candidates, env, resume_ckpt, args.bucket, args.batch_size)
+        usable = [r for r in results if r["finite"] and r["samples_per_sec"] > 0]
+        if usable:
+            best = max(usable, key=lambda r: r["samples_per_sec"])
+            choice = {k: best[k] for k in choice}
+        else:
+            print("⚠️  No config finished the probe; falling back to 32-bit.")
+
+    # Write then rename, so an interrupted save never leaves a corrupt file
+    with open(HARDWARE_PATH + ".tmp", 'w') as f:
+        json.dump({"signature": signature, "candidates": candidates, "choice": choice, "probe": results,
+                   "chosen_at": time.strftime("%Y-%m-%d %H:%M")}, f, indent=4)
+    os.replace(HARDWARE_PATH + ".tmp", HARDWARE_PATH)
+    return choice
+
+# --- BATCH SIZE ---
+
+def count_clips():
+    with open(os.path.join(TRAINING_DIR, "dataset.jsonl"), 'r', encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+def tune_batch_size(hardware, env, resume_ckpt, bucket):
+    """
+    Doubles the batch size, training a few steps at each (the most memory
+    hungry batches first), until it no longer fits with BATCH_HEADROOM to
+    spare. Reports samples/sec per size and saves the table.
+    """
+    print(f"\n--- 📏 Batch Size Finder ({describe_hardware(hardware)}) ---")
+    if bucket != "off":
+        print(f"   Bucketed by {bucket}: each batch holds batch size x the average clip length")
+    print(f"   {'batch':>5} | {'peak memory':>15} | result")
+
+    results = []
+    size = 2
+    limit = min(MAX_TUNED_BATCH_SIZE, count_clips())
+    while size <= limit:
+        # An explicit BUCKET_BUDGET would ignore the batch size, so use the automatic one
+        result = run_probe(hardware, env, resume_ckpt, bucket, size, stress=True, bucket_budget=0)
+        peak, total = result.get("peak_memory_gb"), result.get("total_memory_gb")
+        result["fits"] = bool(result["finite"] and result["samples_per_sec"]) and \
+                         (peak is None or peak <= total * (1 - BATCH_HEADROOM))
+        results.append(dict(result, batch_size=size))
+
+        memory = f"{peak:.1f}/{total:.0f} GB" if peak is not None else "?"
+        status = probe_status(result)
+        if not result["fits"] and result["finite"] and result["samples_per_sec"]:
+            status += ", over the memory limit"
+        print(f"   {size:>5} | {memory:>15} | {status}")
+        if not result["fits"]: break
+        size *= 2
+
+    with open(BATCH_TUNE_PATH + ".tmp", 'w') as f:
+        json.dump({"hardware": hardware, "bucket": bucket, "headroom": BATCH_HEADROOM, "results": results,
+                   "tuned_at": time.strftime("%Y-%m-%d %H:%M")}, f, indent=4)
+    os.replace(BATCH_TUNE_PATH + ".tmp", BATCH_TUNE_PATH)
+
+    fitting = [r for r in results if r["fits"]]
+    if not fitting:
+        print("\n❌ Not even a batch of 2 fits. Try --precision 16 or a smaller QUALITY.")
+        return
+    fastest = max(fitting, key=lambda r: r["samples_per_sec"])
+    print(f"\n✅ Largest batch that fits: {fitting[-1]['batch_size']}"
+          + (" (memory never ran short, stopped at the size limit)" if results[-1]["fits"] else ""))
+    print(f"🚀 Fastest: {fastest['batch_size']} ({fastest['samples_per_sec']:.1f} samples/sec)")
+    print(f"   Set BATCH_SIZE = {fastest['batch_size']} in config.py, or try it with --batch-size {fastest['batch_size']}")
+
+# --- LAUNCH ---
+
+def build_command(resume_ckpt, hardware, max_epochs, bucket, batch_size):
+    # Note: We use --log_every_n_steps (underscores) based on your version
+    # (run through this script, which hands the arguments on to piper_train)
+    cmd = [
+        sys.executable, os.path.abspath(__file__),
+        "--dataset-dir", TRAINING_DIR,
+        "--accelerator", hardware["accelerator"],
+        "--devices", str(hardware["devices"]),
+        "--batch-size", str(batch_size),
+        "--quality", QUALITY,
+        "--resume_from_checkpoint", resume_ckpt,
+        "--checkpoint-epochs", str(SAVE_EVERY_EPOCHS),
+        "--precision", hardware["precision"],
+        "--max_epochs", str(max_epochs),
+        "--log_every_n_steps", "1" 
+    ]
+    if hardware["strategy"]:
+        cmd += ["--strategy", hardware["strategy"]]
+        if bucket != "off":
+            # The bucket sampler splits batches between devices itself
+            cmd += ["--replace_sampler_ddp", "false"]
+    return cmd
+
+def run_piper(options):
+    """
+    Runs piper_train in this process (launched by main() with the piper
+    arguments as our own), with the bucketing and profiling hooks installed.
+    """
+    from pytorch_lightning import Trainer
+    from piper_train.__main__ import main as piper_main
+    from piper_train.vits.lightning import VitsModel
+
+    if options["bucket"] != "off":
+        train_dataloader = VitsModel.train_dataloader
+        VitsModel.train_dataloader = lambda model: bucketed_loader(
+            model, train_dataloader(model), options["bucket"], options["bucket_budget"])
+    if options.get("stress"):
+        loader_to_stress = VitsModel.train_dataloader
+        VitsModel.train_dataloader = lambda model: stressed_loader(model, loader_to_stress(model))
+
+    callbacks = []
+    if options["profile"]:
+        callbacks.append(LoaderProfile())
+    if options.get("probe"):
+        callbacks.append(ThroughputProbe(options["probe"]))
+    if options.get("telemetry"):
+        telemetry = Telemetry(TELEMETRY_PATH, options["telemetry"])
+        callbacks.append(telemetry)
+        save_checkpoint = Trainer.save_checkpoint
+        def timed_save_checkpoint(trainer, filepath, *args, **kwargs):
+            start = time.perf_counter()
+            save_checkpoint(trainer, filepath, *args, **kwargs)
+            telemetry.on_checkpoint_written(trainer, filepath, time.perf_counter() - start)
+        Trainer.save_checkpoint = timed_save_checkpoint
+    if callbacks:
+        fit = Trainer.fit
+        def fit_with_callbacks(trainer, *args, **kwargs):
+            # piper replaces trainer.callbacks after creating the Trainer, so add ours last
+            trainer.callbacks.extend(callbacks)
+            return fit(trainer, *args, **kwargs)
+        Trainer.fit = fit_with_callbacks
+
+    piper_main()
+
 def main():
+    parser = argparse.ArgumentParser(description="Train the voice with piper_train.")
+    parser.add_argument("--bucket", choices=("frames", "tokens", "off"), default=TRAIN_BUCKETING,
+                        help="batch clips of similar length (default: TRAIN_BUCKETING)")
+    parser.add_argument("--bucket-budget", type=int, default=BUCKET_BUDGET,
+                        help="padded frames/tokens per batch (default: BUCKET_BUDGET, 0 = auto)")
+    parser.add_argument("--profile", action="store_true", help="print padding, samples/sec and data waits per epoch")
+    parser.add_argument("--accelerator", choices=("auto", "gpu", "cpu"), default=TRAIN_ACCELERATOR)
+    parser.add_argument("--devices", type=int, default=TRAIN_DEVICES, help="GPUs to train on (0 = all)")
+    parser.add_argument("--precision", choices=("auto", "32", "16", "bf16"), default=TRAIN_PRECISION)
+    parser.add_argument("--probe", action="store_true", help="re-run the hardware throughput probe")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--tune-batch", action="store_true",
+                        help="find the largest and the fastest batch size that fit, then exit")
+    parser.add_argument("--max-epochs", type=int, default=MAX_EPOCHS)
+    parser.add_argument("--summary", action="store_true", help="summarize the telemetry of the latest run, then exit")
+    args = parser.parse_args()
+
+    if args.summary:
+        summarize_telemetry()
+        return
+
     print(f"--- 🚂 Starting Training: {VOICE_NAME} ---")
     print(f"    Quality: {QUALITY}")
-    print(f"    Batch Size: {BATCH_SIZE}")
-    print(f"    Max Epochs: {MAX_EPOCHS}")
+    print(f"    Batch Size: {args.batch_size}" + (f" (bucketed by {args.bucket})" if args.bucket != "off" else ""))
+    print(f"    Max Epochs: {args.max_epochs}")
     
     # 1. Setup Environment
     piper_src = os.path.join(PIPER_DIR, "src", "python")
@@ -37,27 +590,35 @@ def main():
     env["PYTHONPATH"] = piper_src + os.pathsep + env.get("PYTHONPATH", "")
     # Hide the massive amount of pytorch warnings
     env["PYTHONWARNINGS"] = "ignore"
+    env[LAUNCH_OPTIONS_ENV] = json.dumps({"bucket": args.bucket, "bucket_budget": args.bucket_budget,
+                                          "profile": args.profile})
 
     # 2. Get Checkpoint
     resume_ckpt = get_resume_checkpoint()
 
-    # 3. Build Command
-    # Note: We use --log_every_n_steps (underscores) based on your version
-    cmd = [
-        sys.executable, "-m", "piper_train",
-        "--dataset-dir", TRAINING_DIR,
-        "--accelerator", "gpu",
-        "--devices", "1",
-        "--batch-size", str(BATCH_SIZE),
-        "--quality", QUALITY,
-        "--resume_from_checkpoint", resume_ckpt,
-        "--checkpoint-epochs", str(SAVE_EVERY_EPOCHS),
-        "--precision", "32",
-        "--max_epochs", str(MAX_EPOCHS),
-        "--log_every_n_steps", "1" 
-    ]
+    # 3. Pick Hardware
+    try:
+        hardware = choose_hardware(args, env, resume_ckpt)
+    except KeyboardInterrupt:
+        print("\n\n⏸️  Probe interrupted.")
+        return
+    print(f"\n🖥️  Hardware: {describe_hardware(hardware)}")
+
+    if args.tune_batch:
+        try:
+            tune_batch_size(hardware, env, resume_ckpt, args.bucket)
+        except KeyboardInterrupt:
+            print("\n\n⏸️  Batch size finder interrupted.")
+        return
+
+    # 4. Build Command
+    cmd = build_command(resume_ckpt, hardware, args.max_epochs, args.bucket, args.batch_size)
+    options = json.loads(env[LAUNCH_OPTIONS_ENV])
+    options["telemetry"] = {"hardware": describe_hardware(hardware), "batch_size": args.batch_size,
+                            "bucket": args.bucket}
+    env[LAUNCH_OPTIONS_ENV] = json.dumps(options)
 
-    # 4. Run
+    # 5. Run
     try:
         subprocess.run(cmd, env=env)
     except KeyboardInterrupt:
@@ -67,4 +628,7 @@ def main():
         print(f"\n❌ Training Crashed: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if LAUNCH_OPTIONS_ENV in os.environ:
+        run_piper(json.loads(os.environ[LAUNCH_OPTIONS_ENV]))
+    else:
+        main()
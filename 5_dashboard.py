@@ -1,11 +1,15 @@
 import os
-import glob
 import time
 import datetime
 import subprocess
 import sys
 import shutil
 import re
+import ctypes
+import ctypes.util
+import select
+import struct
+from collections import defaultdict
 from config import *
 
 # Try importing visual libraries (optional)
@@ -25,6 +29,13 @@ PREVIEW_IMG = "preview_spectrogram.png"
 PROMPT_FILE = "prompt.txt"
 METADATA_PATH = os.path.join(DATASET_DIR, "metadata.csv")
 
+# Checkpoint watcher: folders that never hold checkpoints (preprocessed tensors),
+# how long a checkpoint's size must hold still to count as written,
+# and how often to look for changes when inotify isn't available
+SKIP_DIRS = {"cache"}
+STABLE_SECONDS = 1.0
+POLL_SECONDS = 5
+
 # Epoch where the Base Model started (HFC Female is ~2868)
 BASE_START_EPOCH = 2868 
 
@@ -35,6 +46,203 @@ YELLOW = "\033[93m"
 CYAN = "\033[96m"
 RESET = "\033[0m"
 
+# --- CHECKPOINT WATCHER ---
+
+# inotify event flags (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# struct inotify_event: wd, mask, cookie, len (then the name)
+EVENT_HEADER = struct.Struct("iIII")
+
+def open_inotify():
+    """(libc, inotify fd) through ctypes, or (None, None) where inotify isn't available."""
+    if not sys.platform.startswith("linux"):
+        return None, None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None, None
+    return (libc, fd) if fd >= 0 else (None, None)
+
+class CheckpointWatcher:
+    """
+    Keeps an index of the checkpoints under `root` and reports new ones once
+    they are completely written (closed or renamed into place, size stable).
+    Uses inotify on Linux; elsewhere, or past the inotify watch limit, it
+    polls directory mtimes and only re-reads directories that changed. Either
+    way a tick costs O(new files), not O(checkpoints).
+    """
+    def __init__(self, root):
+        self.root = root
+        self.known = defaultdict(dict)  # directory -> {checkpoint: mtime_ns}
+        self.pending = {}               # checkpoint -> (size, mtime_ns, unchanged since)
+        self.polled = {}                # directory -> mtime_ns, for directories without a watch
+        self.watches = {}               # inotify watch descriptor -> directory
+        self.libc, self.fd = open_inotify()
+        self.indexed = False
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else f"polling every {POLL_SECONDS}s"
+
+    def add_tree(self, top):
+        """Watches a directory tree, then indexes it (watch first, so no file slips in between)."""
+        self.watch_dir(top)
+        try:
+            entries = list(os.scandir(top))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    self.add_tree(entry.path)
+            elif entry.name.endswith(".ckpt"):
+                self.mark_pending(entry.path)
+
+    def watch_dir(self, path):
+        if self.fd is not None:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = path
+                return
+        try:
+            self.polled[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+
+    def mark_pending(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return  # already gone
+        if self.known[os.path.dirname(path)].get(path) == stat.st_mtime_ns:
+            return
+        self.pending[path] = (stat.st_size, stat.st_mtime_ns, time.monotonic())
+
+    def forget_tree(self, top):
+        """Drops a removed (or moved away) directory tree from the index and its watches."""
+        prefix = top + os.sep
+        inside = lambda path: path == top or path.startswith(prefix)
+        for directory in [d for d in self.known if inside(d)]:
+            del self.known[directory]
+        for path in [p for p in self.pending if inside(p)]:
+            del self.pending[path]
+        for directory in [d for d in self.polled if inside(d)]:
+            del self.polled[directory]
+        for wd in [wd for wd, d in self.watches.items() if inside(d)]:
+            self.libc.inotify_rm_watch(self.fd, wd)
+            del self.watches[wd]
+
+    def read_events(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready: return
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: re-watch and re-index (known checkpoints aren't reported again)
+                for lost in list(self.watches):
+                    self.libc.inotify_rm_watch(self.fd, lost)
+                self.watches.clear()
+                self.add_tree(self.root)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name: continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in SKIP_DIRS:
+                    self.add_tree(path)
+                elif mask & IN_MOVED_FROM:
+                    self.forget_tree(path)
+            elif name.endswith(".ckpt"):
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self.mark_pending(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.known[directory].pop(path, None)
+                    self.pending.pop(path, None)
+
+    def poll_dirs(self):
+        for directory, mtime in list(self.polled.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                self.forget_tree(directory)
+                continue
+            if current == mtime: continue
+            self.polled[directory] = current
+
+            # Something was added or removed here: re-read just this directory
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            present = set()
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS and entry.path not in self.polled:
+                        self.add_tree(entry.path)
+                elif entry.name.endswith(".ckpt"):
+                    present.add(entry.path)
+                    if entry.path not in self.known[directory] and entry.path not in self.pending:
+                        self.mark_pending(entry.path)
+            for path in [p for p in self.known[directory] if p not in present]:
+                del self.known[directory][path]
+
+    def settle(self):
+        """Moves pending checkpoints whose size and mtime held still for STABLE_SECONDS into the index."""
+        done = []
+        now = time.monotonic()
+        for path, (size, mtime, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= STABLE_SECONDS and stat.st_size > 0:
+                del self.pending[path]
+                self.known[os.path.dirname(path)][path] = stat.st_mtime_ns
+                done.append((stat.st_mtime_ns, path))
+        return [path for _, path in sorted(done)]
+
+    def wait(self, timeout):
+        """Waits up to `timeout` seconds for checkpoints to finish. Returns them, oldest first."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if not self.indexed and os.path.isdir(self.root):
+                self.add_tree(self.root)
+                self.indexed = True
+
+            remaining = max(deadline - time.monotonic(), 0)
+            if self.pending:
+                remaining = min(remaining, STABLE_SECONDS)
+            if self.fd is not None and self.watches:
+                self.read_events(remaining)
+            else:
+                time.sleep(remaining)
+            self.poll_dirs()
+
+            done = self.settle()
+            if done or time.monotonic() >= deadline:
+                return done
+
 def get_formatted_time(seconds):
     """Converts seconds into 00h:00m:00s format"""
     return str(datetime.timedelta(seconds=int(seconds)))
@@ -120,7 +328,8 @@ def main():
         return
 
     print(f"📝 Synced Fallback: \"{ref_text[:30]}...\"")
-    print(f"👀 Watching:        {TRAINING_DIR}")
+    watcher = CheckpointWatcher(TRAINING_DIR)
+    print(f"👀 Watching:        {TRAINING_DIR} ({watcher.mode})")
     print(f"💡 Tip: Edit '{PROMPT_FILE}' to test custom words.")
     
     last_processed = ""
@@ -131,15 +340,13 @@ def main():
     if sys.platform == "win32": piper_bin += ".exe"
 
     while True:
-        search_pattern = os.path.join(TRAINING_DIR, "**", "*.ckpt")
-        checkpoints = glob.glob(search_pattern, recursive=True)
+        # Only returns checkpoints that have been completely written
+        checkpoints = watcher.wait(POLL_SECONDS)
         
         if checkpoints:
-            newest = max(checkpoints, key=os.path.getmtime)
+            newest = checkpoints[-1]
             
             if newest != last_processed:
-                time.sleep(3) # Wait for file write
-                
                 # --- TIMER LOGIC ---
                 current_time = time.time()
                 time_diff = current_time - last_ckpt_time
@@ -199,8 +406,6 @@ def main():
                 last_processed = newest
                 last_ckpt_time = current_time
                 first_run = False
-        
-        time.sleep(10)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,8 +5,26 @@ import re
 import time
 import glob
 import json
+import argparse
+import hashlib
+import queue
+import shutil
 import wave
 import struct
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Optional in-process engine (falls back to the piper binary if missing)
+try:
+    import numpy as np
+    import onnxruntime
+    from piper_phonemize import phonemize_espeak, phonemize_codepoints
+    HAS_ENGINE = True
+except ImportError:
+    HAS_ENGINE = False
 
 # --- CONFIGURATION ---
 try:
@@ -29,8 +47,8 @@ if 'MODELS_DIR' not in locals():
 # --- PATHS ---
 OUTPUT_WAVS_DIR = os.path.join(OUTPUT_DIR, "generated_wavs")
 TXT_INPUT_DIR = "txts"
-TEMP_DIR = "temp_chunks"
 SETTINGS_FILE = os.path.join(TXT_INPUT_DIR, "tts_settings.json")
+CACHE_DIR = os.path.join(OUTPUT_DIR, "tts_cache")
 
 # Default model path
 DEFAULT_MODEL_PATH = os.path.join(PIPER_DIR, f"{VOICE_NAME}.onnx")
@@ -39,14 +57,18 @@ PIPER_BINARY = os.path.join(PIPER_DIR, "piper")
 
 def ensure_setup():
     """Initializes folders and checks for required binaries."""
-    for d in [OUTPUT_DIR, OUTPUT_WAVS_DIR, TXT_INPUT_DIR, TEMP_DIR, MODELS_DIR]:
+    for d in [OUTPUT_DIR, OUTPUT_WAVS_DIR, TXT_INPUT_DIR, MODELS_DIR]:
         if not os.path.exists(d):
             os.makedirs(d)
             print(f"Created directory: {d}")
 
     if not os.path.exists(PIPER_BINARY):
+        if HAS_ENGINE:
+            print(f"⚠️  Piper binary not found at {PIPER_BINARY}. Using the in-process engine only.")
+            return
         print(f"❌ Error: Piper binary not found at {PIPER_BINARY}")
         print(f"   Make sure it is inside PIPER_DIR and marked executable (chmod +x piper)")
+        print(f"   (or 'pip install onnxruntime piper-phonemize' to synthesize without it)")
         sys.exit(1)
 
 def play_audio_linux(file_path):
@@ -61,14 +83,100 @@ def play_audio_linux(file_path):
         except FileNotFoundError:
             print("⚠️  Could not play audio. Please install 'alsa-utils' (aplay).")
 
+class AudioPlayer:
+    """
+    One long-lived player process fed with raw PCM from a queue, so playback
+    starts with the first chunk while the rest is still being synthesized.
+    With no aplay/paplay (or "playback": "null") a stand-in sink consumes the
+    audio in real time instead, which keeps timings honest on headless boxes.
+    """
+
+    def __init__(self, backend="auto"):
+        self.backend = backend
+        self.sample_rate = None
+        self.process = None
+        self.thread = None
+        self.queue = queue.Queue()
+
+    def _command(self, sample_rate):
+        if self.backend in ("auto", "aplay") and shutil.which("aplay"):
+            return ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-c", "1", "-r", str(sample_rate), "-"]
+        if self.backend in ("auto", "paplay") and shutil.which("paplay"):
+            return ["paplay", "--raw", "--format=s16le", "--channels=1", f"--rate={sample_rate}"]
+        return None
+
+    def start(self, sample_rate):
+        if self.thread and self.thread.is_alive() and sample_rate == self.sample_rate:
+            return
+        self.stop()
+        self.sample_rate = sample_rate
+        cmd = self._command(sample_rate)
+        if cmd:
+            self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        elif self.backend != "null":
+            print("⚠️  No aplay/paplay found. Using a silent stand-in player.")
+        self.thread = threading.Thread(target=self._feed, daemon=True)
+        self.thread.start()
+
+    def play(self, pcm):
+        self.queue.put(pcm)
+
+    def wait(self):
+        """Blocks until everything queued has been handed to the player."""
+        self.queue.join()
+
+    def stop(self):
+        if self.thread and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.process:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+        self.process = None
+        self.thread = None
+
+    def _feed(self):
+        while True:
+            pcm = self.queue.get()
+            try:
+                if pcm is None: return
+                if self.process:
+                    try:
+                        self.process.stdin.write(pcm)
+                        self.process.stdin.flush()
+                    except (BrokenPipeError, OSError):
+                        print("⚠️  Audio player exited. Using a silent stand-in player.")
+                        self.process = None
+                if not self.process:
+                    # Stand-in sink: "play" in real time
+                    time.sleep(len(pcm) / 2 / self.sample_rate)
+            finally:
+                self.queue.task_done()
+
+PLAYER = AudioPlayer()
+
 def _get_default_settings():
     return {
         "autoplay": True,
+        "playback": "auto",
+        "engine": "onnx",
         "default_version": "version_5", 
         "length_scale": 1.0,
         "noise_scale": 0.667,
         "noise_w": 0.8,
-        "sentence_silence": 0.2
+        "sentence_silence": 0.2,
+        "workers": 1,
+        "max_chunk_chars": 300,
+        "streaming": True,
+        "cache": True,
+        "cache_max_mb": 1024,
+        "server_workers": 2,
+        "server_queue": 16,
+        "pool_max_models": 3,
+        "pool_max_memory_mb": 2048
     }
 
 def get_settings():
@@ -128,41 +236,406 @@ def find_model_path(version_name=None):
     print(f"⚠️  Model version '{version_name}' not found in '{MODELS_DIR}'. Using default fallback.")
     return DEFAULT_MODEL_PATH
 
-# --- AUDIO UTILS ---
+# --- IN-PROCESS ENGINE ---
 
-def create_silence(duration_ms, output_path, sample_rate=22050):
-    num_samples = int((duration_ms / 1000.0) * sample_rate)
-    with wave.open(output_path, 'wb') as wav_file:
-        wav_file.setparams((1, 2, sample_rate, num_samples, 'NONE', 'not compressed'))
-        wav_file.writeframes(struct.pack('<h', 0) * num_samples)
+class PiperEngine:
+    """Keeps one .onnx voice loaded in onnxruntime so every chunk skips the cold start."""
 
-def merge_wavs(file_list, final_output):
-    if not file_list: return
-    data = []
-    params = None
-    
-    valid_files = [f for f in file_list if os.path.exists(f)]
-    if not valid_files: return
+    def __init__(self, model_path, threads=0):
+        with open(model_path + ".json", 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+
+        self.model_path = model_path
+        self.sample_rate = self.config["audio"]["sample_rate"]
+        self.espeak_voice = self.config.get("espeak", {}).get("voice", "en-us")
+        self.phoneme_type = self.config.get("phoneme_type", "espeak")
+        self.phoneme_id_map = self.config["phoneme_id_map"]
+        self.num_speakers = self.config.get("num_speakers", 1)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            # Parallel workers share the cores instead of each grabbing all of them
+            options.intra_op_num_threads = threads
+
+        self.session = onnxruntime.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+
+    def phonemize(self, text):
+        """Returns one list of phonemes per sentence (same rules as the piper binary)."""
+        if self.phoneme_type == "text":
+            return phonemize_codepoints(text)
+        return phonemize_espeak(text, self.espeak_voice)
+
+    def phonemes_to_ids(self, phonemes):
+        # BOS, then every phoneme followed by PAD, then EOS
+        ids = list(self.phoneme_id_map["^"])
+        for phoneme in phonemes:
+            if phoneme not in self.phoneme_id_map: continue
+            ids.extend(self.phoneme_id_map[phoneme])
+            ids.extend(self.phoneme_id_map["_"])
+        ids.extend(self.phoneme_id_map["$"])
+        return ids
 
+    def synthesize(self, text, settings):
+        """Returns raw 16-bit mono PCM for the text, sentence silences included."""
+        scales = np.array(
+            [settings['noise_scale'], settings['length_scale'], settings['noise_w']],
+            dtype=np.float32
+        )
+        silence = bytes(int(self.sample_rate * settings['sentence_silence']) * 2)
+
+        pcm = bytearray()
+        for phonemes in self.phonemize(text):
+            ids = self.phonemes_to_ids(phonemes)
+            inputs = {
+                "input": np.array([ids], dtype=np.int64),
+                "input_lengths": np.array([len(ids)], dtype=np.int64),
+                "scales": scales
+            }
+            if self.num_speakers > 1:
+                inputs["sid"] = np.array([0], dtype=np.int64)
+
+            audio = self.session.run(None, inputs)[0].squeeze()
+            # Normalize like piper does before converting to int16
+            audio = audio * (32767.0 / max(0.01, float(np.max(np.abs(audio)))))
+            pcm += np.clip(audio, -32768, 32767).astype(np.int16).tobytes()
+            pcm += silence
+        return bytes(pcm)
+
+def get_rss_mb():
+    """Resident memory of this process in MB (0 if /proc is unavailable)."""
     try:
-        for f in valid_files:
-            with wave.open(f, 'rb') as w:
-                if not params: params = w.getparams()
-                data.append(w.readframes(w.getnframes()))
-        
-        with wave.open(final_output, 'wb') as out:
-            out.setparams(params)
-            for frames in data:
-                out.writeframes(frames)
-    except Exception as e:
-        print(f"⚠️ Error merging: {e}")
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except Exception:
+        return 0
+
+def get_peak_rss_mb():
+    """Peak resident memory of this process in MB."""
+    try:
+        import resource
+        # ru_maxrss is in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return 0
+
+class ModelPool:
+    """
+    Keeps recently used voices loaded, so switching 'version:' tags is instant
+    after the first load. Least recently used models are evicted once either
+    the model count or their combined resident memory goes over the limit.
+    """
+
+    def __init__(self, max_models=3, max_memory_mb=2048):
+        self.max_models = max_models
+        self.max_memory_mb = max_memory_mb
+        self.engines = OrderedDict()  # model_path -> (engine, size_mb)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.threads = 0  # onnxruntime threads per session (0 = all cores)
+        self.lock = threading.Lock()
+
+    def configure(self, settings):
+        with self.lock:
+            self.max_models = max(1, int(settings.get("pool_max_models", self.max_models)))
+            self.max_memory_mb = float(settings.get("pool_max_memory_mb", self.max_memory_mb))
+
+            workers = get_worker_count(settings, os.cpu_count() or 1)
+            threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else 0
+            if threads != self.threads:
+                # Sessions are built for a thread count, reload them lazily
+                self.threads = threads
+                self.engines.clear()
+            self._evict(keep=None)
+
+    def get(self, model_path):
+        with self.lock:
+            if model_path in self.engines:
+                self.hits += 1
+                self.engines.move_to_end(model_path)
+                return self.engines[model_path][0]
+
+            self.misses += 1
+            print(f"   🧠 Loading model: {get_model_label(model_path)}")
+            rss_before = get_rss_mb()
+            engine = PiperEngine(model_path, self.threads)
+            # Measured growth of the process, or the file size if /proc is missing
+            size_mb = get_rss_mb() - rss_before
+            if size_mb <= 0:
+                size_mb = os.path.getsize(model_path) / (1024 * 1024)
+
+            self.engines[model_path] = (engine, size_mb)
+            self._evict(keep=model_path)
+            return engine
+
+    def drop(self, model_path):
+        with self.lock:
+            self.engines.pop(model_path, None)
+
+    def memory_mb(self):
+        return sum(size for _, size in self.engines.values())
+
+    def _evict(self, keep):
+        while len(self.engines) > 1 and (
+            len(self.engines) > self.max_models or self.memory_mb() > self.max_memory_mb
+        ):
+            oldest = next(iter(self.engines))
+            if oldest == keep: break
+            del self.engines[oldest]
+            self.evictions += 1
+            print(f"   ♻️  Evicted model: {get_model_label(oldest)}")
+
+    def summary(self):
+        loaded = ", ".join(get_model_label(p) for p in self.engines) or "none"
+        return (f"{len(self.engines)}/{self.max_models} loaded ({self.memory_mb():.0f}/{self.max_memory_mb:.0f} MB) | "
+                f"hits {self.hits} | misses {self.misses} | evictions {self.evictions}\n"
+                f"   🗂️  Loaded: {loaded}")
+
+def get_model_label(model_path):
+    """Short name for a model, e.g. 'version_5/version_5.onnx'."""
+    try:
+        rel = os.path.relpath(model_path, MODELS_DIR)
+        if not rel.startswith(".."): return rel
+    except ValueError:
+        pass
+    return os.path.basename(model_path)
+
+MODEL_POOL = ModelPool()
+
+def get_engine(model_path):
+    return MODEL_POOL.get(model_path)
+
+# --- AUDIO UTILS ---
+
+def get_model_sample_rate(model_path):
+    """Reads the sample rate from the model's .onnx.json (22050 if unreadable)."""
+    try:
+        with open(model_path + ".json", 'r', encoding='utf-8') as f:
+            return json.load(f)["audio"]["sample_rate"]
+    except Exception:
+        return 22050
+
+def make_silence(duration_ms, sample_rate=22050):
+    """Raw 16-bit mono PCM of silence."""
+    return bytes(int((duration_ms / 1000.0) * sample_rate) * 2)
+
+def write_wav(output_path, pcm, sample_rate):
+    with wave.open(output_path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+
+# --- SYNTHESIS CACHE ---
+
+_FILE_HASHES = {}
+
+def hash_file(path):
+    """sha256 of a file, cached while its size and mtime are unchanged."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    if key not in _FILE_HASHES:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        _FILE_HASHES[key] = h.hexdigest()
+    return _FILE_HASHES[key]
+
+class SynthCache:
+    """
+    Disk cache of synthesized chunks, keyed by model file hash, normalized text
+    and the synthesis settings. Entries are raw PCM files; the least recently
+    used ones (by mtime, refreshed on every hit) are deleted past max_mb.
+    """
+
+    STATS_FILE = "cache_stats.json"
+
+    def __init__(self, cache_dir, max_mb=1024):
+        self.cache_dir = cache_dir
+        self.max_mb = max_mb
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = None  # scanned lazily
+        self.lock = threading.Lock()
+
+    def make_key(self, text, settings, model_path):
+        normalized = " ".join(text.split())
+        params = [settings[k] for k in ("length_scale", "noise_scale", "noise_w", "sentence_silence")]
+        blob = json.dumps([hash_file(model_path), normalized, params])
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pcm")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".pcm"):
+                    yield os.path.join(root, name)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                pcm = f.read()
+            os.utime(path)  # mark as recently used
+        except OSError:
+            with self.lock: self.misses += 1
+            return None
+        with self.lock: self.hits += 1
+        return pcm
+
+    def put(self, key, pcm):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pcm)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.size_bytes is None:
+                self.size_bytes = sum(os.path.getsize(p) for p in self._entries())
+            else:
+                self.size_bytes += len(pcm)
+            if self.size_bytes > self.max_mb * 1024 * 1024:
+                self._evict()
+
+    def _evict(self):
+        # Drop oldest entries until we are back under 90% of the limit
+        entries = []
+        for p in self._entries():
+            try: entries.append((os.path.getmtime(p), os.path.getsize(p), p))
+            except OSError: pass
+        entries.sort()
+        self.size_bytes = sum(size for _, size, _ in entries)
+        target = self.max_mb * 1024 * 1024 * 0.9
+        for _, size, p in entries:
+            if self.size_bytes <= target: break
+            try: os.remove(p)
+            except OSError: continue
+            self.size_bytes -= size
+            self.evictions += 1
+
+    def save_stats(self):
+        """Adds this session's counters to the lifetime totals on disk."""
+        with self.lock:
+            if not (self.hits or self.misses or self.evictions): return
+            totals = self.load_stats()
+            totals["hits"] += self.hits
+            totals["misses"] += self.misses
+            totals["evictions"] += self.evictions
+            self.hits = self.misses = self.evictions = 0
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, self.STATS_FILE), 'w') as f:
+                json.dump(totals, f, indent=4)
+
+    def load_stats(self):
+        totals = {"hits": 0, "misses": 0, "evictions": 0}
+        try:
+            with open(os.path.join(self.cache_dir, self.STATS_FILE), 'r') as f:
+                totals.update(json.load(f))
+        except Exception:
+            pass
+        return totals
+
+    def clear(self):
+        with self.lock:
+            for p in list(self._entries()):
+                try: os.remove(p)
+                except OSError: pass
+            self.size_bytes = 0
+
+SYNTH_CACHE = SynthCache(CACHE_DIR)
+
+def show_cache_stats(pause=True):
+    SYNTH_CACHE.save_stats()
+    totals = SYNTH_CACHE.load_stats()
+    sizes = [os.path.getsize(p) for p in SYNTH_CACHE._entries()]
+    lookups = totals["hits"] + totals["misses"]
+
+    print(f"\n--- 🗄️  Synthesis Cache ---")
+    print(f"   Location:  {CACHE_DIR}/")
+    print(f"   Entries:   {len(sizes)}")
+    print(f"   Size:      {sum(sizes) / (1024 * 1024):.1f} / {get_settings().get('cache_max_mb', 1024)} MB")
+    print(f"   Hits:      {totals['hits']} | Misses: {totals['misses']} | Evictions: {totals['evictions']}")
+    if lookups:
+        print(f"   Hit rate:  {100.0 * totals['hits'] / lookups:.1f}%")
+    if pause:
+        if input("\nType 'clear' to empty the cache, or Enter to continue: ").strip().lower() == "clear":
+            SYNTH_CACHE.clear()
+            print("🗑️  Cache cleared.")
+            input("Press Enter to continue...")
 
 # --- PROCESSING ---
 
-def process_text_to_audio(input_text, final_filename):
-    settings = get_settings()
-    
-    # --- MODEL SELECTION LOGIC ---
+def get_worker_count(settings, num_chunks):
+    """Parallel synthesis workers: "workers" in settings, 0 means one per CPU core."""
+    try:
+        workers = int(settings.get("workers", 1))
+    except (TypeError, ValueError):
+        workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, num_chunks))
+
+# Words ending in '.' that don't end a sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "jr", "sr", "vs", "etc", "e.g", "i.e", "prof"}
+
+def split_sentences(text):
+    # Closing quotes/brackets stay with the sentence they close: "Hi." | she said
+    parts = re.split(r'([.!?]["\')\]]*)\s+', text.strip())
+    pieces = [body + end for body, end in zip(parts[0::2], parts[1::2] + [""])]
+    sentences = []
+    for piece in pieces:
+        if sentences:
+            last_word = sentences[-1].rsplit(None, 1)[-1].rstrip(".\"')]").lower()
+            # "No." is a sentence of its own, except before a number ("No. 5")
+            if last_word in ABBREVIATIONS or (last_word == "no" and piece[:1].isdigit()):
+                sentences[-1] += " " + piece
+                continue
+        sentences.append(piece)
+    return [s for s in sentences if s.strip()]
+
+def pack_pieces(pieces, max_chars):
+    """Greedily joins consecutive pieces while they fit in max_chars."""
+    units = []
+    for piece in pieces:
+        if units and len(units[-1]) + 1 + len(piece) <= max_chars:
+            units[-1] += " " + piece
+        else:
+            units.append(piece)
+    return units
+
+def segment_text(text, max_chars):
+    """
+    Splits text into synthesis units of at most max_chars: long sentences are
+    cut at clause punctuation (then at spaces), short neighbouring sentences
+    are batched together. max_chars <= 0 keeps the text as one unit.
+    """
+    if max_chars <= 0 or len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    for sentence in split_sentences(text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in pack_pieces(re.split(r'(?<=[,;:])\s+', sentence), max_chars):
+            if len(clause) <= max_chars:
+                pieces.append(clause)
+            else:
+                pieces.extend(pack_pieces(clause.split(), max_chars))
+    return pack_pieces(pieces, max_chars)
+
+def resolve_model(input_text, settings, quiet=False):
+    """Picks the model from a 'version:' tag or the settings. Returns (model_path, text)."""
     version_match = re.search(r'(?:^|\n)version:\s*([\w\-\.]+)', input_text, re.IGNORECASE)
     
     active_model_path = DEFAULT_MODEL_PATH
@@ -170,47 +643,52 @@ def process_text_to_audio(input_text, final_filename):
 
     if version_match:
         version_name = version_match.group(1).strip()
-        print(f"   🔍 Version Override (Tag): {version_name}")
+        if not quiet: print(f"   🔍 Version Override (Tag): {version_name}")
         active_model_path = find_model_path(version_name)
         clean_text = re.sub(r'(?:^|\n)version:\s*[\w\-\.]+', '', input_text, flags=re.IGNORECASE).strip()
     
     elif settings.get("default_version"):
         version_name = settings["default_version"].strip()
-        print(f"   🔍 Version Default (Settings): {version_name}")
+        if not quiet: print(f"   🔍 Version Default (Settings): {version_name}")
         active_model_path = find_model_path(version_name)
         clean_text = input_text
     
     else:
-        print(f"   🤖 Using Global Default Model")
+        if not quiet: print(f"   🤖 Using Global Default Model")
         active_model_path = DEFAULT_MODEL_PATH
         clean_text = input_text
 
+    return active_model_path, clean_text
+
+def plan_text(input_text, settings, quiet=False):
+    """
+    Resolves the model and splits tagged text into an ordered plan of
+    (index, duration_ms or None, text, settings) chunks.
+    """
+    active_model_path, clean_text = resolve_model(input_text, settings, quiet)
+
     # 2. Tag Cleaning
     text = re.sub(r'</?speak>', '', clean_text).strip()
     text = re.sub(r'<down\s*/?>', '...<DOWN_TRIGGER>', text, flags=re.IGNORECASE)
     
     if not text:
-        print("   ⚠️ Input text is empty. Skipping.")
-        return None
+        return active_model_path, []
 
     parts = re.split(r'(<break\s+time=["\']\d+[ms]*["\']\s*/>)', text)
-    
-    chunk_files = []
-    current_sample_rate = 22050 
 
+    # 3. Plan chunks: silences are generated, speech goes to the worker pool
+    plan = []  # (index, duration_ms or None, text, settings)
     for i, part in enumerate(parts):
         part = part.strip()
         if not part: continue
-        
-        chunk_path = os.path.join(TEMP_DIR, f"chunk_{i}.wav")
+
         break_match = re.search(r'time=["\'](\d+)(ms|s)["\']', part)
-        
+
         if break_match:
             val = int(break_match.group(1))
             unit = break_match.group(2)
             duration_ms = val if unit == "ms" else val * 1000
-            create_silence(duration_ms, chunk_path, current_sample_rate)
-            chunk_files.append(chunk_path)
+            plan.append((i, duration_ms, None, None))
         else:
             active_settings = settings.copy()
             if "<DOWN_TRIGGER>" in part:
@@ -220,48 +698,195 @@ def process_text_to_audio(input_text, final_filename):
 
             clean_part = re.sub(r'<[^>]+>', '', part)
             if not clean_part: continue
+            for unit in segment_text(clean_part, int(settings.get("max_chunk_chars", 0) or 0)):
+                plan.append((i, None, unit, active_settings))
+
+    return active_model_path, plan
+
+def synthesize_plan(plan, model_path, workers=1):
+    """
+    Yields the PCM of every planned chunk in order (None for failed chunks).
+    With several workers, a bounded window of upcoming chunks is synthesized
+    ahead, so memory stays flat no matter how long the text is.
+    """
+    sample_rate = get_model_sample_rate(model_path)
+
+    if workers <= 1:
+        for _, duration_ms, chunk_text, chunk_settings in plan:
+            if duration_ms is not None:
+                yield make_silence(duration_ms, sample_rate)
+            else:
+                yield synthesize_chunk(chunk_text, chunk_settings, model_path)
+        return
+
+    window = deque()  # silences (bytes) and pending speech (futures), in order
+    in_flight = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for _, duration_ms, chunk_text, chunk_settings in plan:
+                if duration_ms is not None:
+                    window.append(make_silence(duration_ms, sample_rate))
+                else:
+                    window.append(pool.submit(synthesize_chunk, chunk_text, chunk_settings, model_path))
+                    in_flight += 1
+
+                while in_flight > workers * 2:
+                    item = window.popleft()
+                    if isinstance(item, Future):
+                        in_flight -= 1
+                        item = item.result()
+                    yield item
+
+            while window:
+                item = window.popleft()
+                yield item.result() if isinstance(item, Future) else item
+        finally:
+            # Stopped early: don't synthesize what nobody will read
+            for item in window:
+                if isinstance(item, Future): item.cancel()
 
-            success = run_piper_cmd(clean_part, chunk_path, active_settings, active_model_path)
-            
-            if success and os.path.exists(chunk_path):
-                chunk_files.append(chunk_path)
-                try:
-                    with wave.open(chunk_path, 'rb') as w:
-                        current_sample_rate = w.getframerate()
-                except: pass
+def open_wav_stream(output_path, sample_rate):
+    """Opens a WAV for incremental writes; the header is patched on close."""
+    f = open(output_path, 'wb')
+    w = wave.open(f, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(sample_rate)
+    return f, w
 
-    if not chunk_files:
+# Timings of the most recent render (read by interactive mode)
+LAST_RENDER = {}
+
+def process_text_to_audio(input_text, final_filename, autoplay=None, stream=False, raw_out=None,
+                          settings=None, workers=None, player=None):
+    """
+    Renders tagged text to OUTPUT_WAVS_DIR/final_filename.
+
+    stream=True appends every chunk to the WAV as soon as it is ready instead
+    of buffering the whole file, and raw_out (a binary file such as
+    sys.stdout.buffer) receives the raw PCM as it is produced. A player
+    (AudioPlayer) starts playback with the first chunk instead of the end.
+    settings/workers override tts_settings.json (used by batch rendering).
+    """
+    settings = settings or get_settings()
+    MODEL_POOL.configure(settings)
+    SYNTH_CACHE.max_mb = float(settings.get("cache_max_mb", SYNTH_CACHE.max_mb))
+
+    active_model_path, plan = plan_text(input_text, settings)
+    if not plan:
+        print("   ⚠️ Input text is empty. Skipping.")
+        return None
+
+    speech_count = sum(1 for _, ms, _, _ in plan if ms is None)
+    workers = workers or get_worker_count(settings, speech_count)
+    if workers > 1:
+        print(f"   ⚡ Synthesizing {speech_count} chunks with {workers} workers...")
+
+    sample_rate = get_model_sample_rate(active_model_path)
+    final_path = os.path.join(OUTPUT_WAVS_DIR, final_filename) if final_filename else None
+    if raw_out:
+        print(f"   🔊 Raw PCM: s16le, mono, {sample_rate} Hz")
+
+    # Sinks: one in-memory buffer, or a WAV that grows chunk by chunk
+    pcm = bytearray()
+    wav_file = wav_out = None
+    if player:
+        stream = True
+        player.start(sample_rate)
+    if stream and final_path:
+        wav_file, wav_out = open_wav_stream(final_path, sample_rate)
+
+    spoken = 0
+    first_audio = None
+    start = time.perf_counter()
+    try:
+        for chunk in synthesize_plan(plan, active_model_path, workers):
+            if not chunk: continue
+            if stream or raw_out:
+                if spoken == 0:
+                    first_audio = time.perf_counter() - start
+                    print(f"   ⏱️  First audio after {first_audio:.2f} s")
+                if player:
+                    player.play(chunk)
+                if wav_out:
+                    wav_out.writeframesraw(chunk)
+                    wav_file.flush()
+                if raw_out:
+                    raw_out.write(chunk)
+                    raw_out.flush()
+            else:
+                pcm += chunk
+            spoken += 1
+    finally:
+        if wav_out:
+            wav_out.close()
+            wav_file.close()
+        SYNTH_CACHE.save_stats()
+
+    if not spoken:
         print("   ❌ No audio generated.")
+        if wav_out: os.remove(final_path)
+        return None
+
+    if final_path and not stream:
+        write_wav(final_path, pcm, sample_rate)
+
+    if not final_path:
         return None
 
-    final_path = os.path.join(OUTPUT_WAVS_DIR, final_filename)
-    merge_wavs(chunk_files, final_path)
-    
-    # Cleanup
-    for f in chunk_files:
-        try: os.remove(f)
-        except: pass
-        
     print(f"   ✅ Saved: {final_filename}")
 
-    if settings['autoplay']:
+    if player:
+        player.wait()
+    elif settings['autoplay'] if autoplay is None else autoplay:
         play_audio_linux(final_path)
-    
+
+    if first_audio is not None:
+        LAST_RENDER["first_audio"] = first_audio
     return final_path
 
-def run_piper_cmd(text, output_path, settings, model_path):
+def synthesize_chunk(text, settings, model_path):
+    """
+    Returns raw 16-bit PCM for the text (None on failure). Repeated chunks
+    come from the synthesis cache; new ones are synthesized and stored.
+    """
+    if not settings.get("cache", True) or not os.path.exists(model_path):
+        return synthesize_uncached(text, settings, model_path)
+
+    key = SYNTH_CACHE.make_key(text, settings, model_path)
+    pcm = SYNTH_CACHE.get(key)
+    if pcm is None:
+        pcm = synthesize_uncached(text, settings, model_path)
+        if pcm:
+            SYNTH_CACHE.put(key, pcm)
+    return pcm
+
+def synthesize_uncached(text, settings, model_path):
+    """Synthesizes with the warm in-process engine, or the piper binary as a fallback."""
+    if HAS_ENGINE and settings.get("engine", "onnx") == "onnx":
+        if not os.path.exists(model_path) or not os.path.exists(model_path + ".json"):
+            # Let the binary path report what is missing
+            return run_piper_cmd(text, settings, model_path)
+        try:
+            return get_engine(model_path).synthesize(text, settings)
+        except Exception as e:
+            print(f"\n⚠️  Engine Error ({e}). Falling back to piper binary.")
+
+    return run_piper_cmd(text, settings, model_path)
+
+def run_piper_cmd(text, settings, model_path):
     if not os.path.exists(model_path):
         print(f"\n❌ Model missing: {model_path}")
-        return False
+        return None
     if not os.path.exists(model_path + ".json"):
         print(f"\n❌ Config missing: {model_path}.json")
-        return False
+        return None
 
     try:
         cmd = [
             PIPER_BINARY,
             "--model", model_path,
-            "--output_file", output_path,
+            "--output_raw",
             "--length_scale", str(settings['length_scale']),
             "--noise_scale", str(settings['noise_scale']),
             "--noise_w", str(settings['noise_w']),
@@ -272,14 +897,14 @@ def run_piper_cmd(text, output_path, settings, model_path):
         process = subprocess.Popen(
             cmd, 
             stdin=subprocess.PIPE, 
-            stdout=subprocess.DEVNULL, 
+            stdout=subprocess.PIPE, 
             stderr=subprocess.DEVNULL
         )
-        process.communicate(input=text.encode('utf-8'))
-        return process.returncode == 0
+        pcm, _ = process.communicate(input=text.encode('utf-8'))
+        return pcm if process.returncode == 0 and pcm else None
     except Exception as e:
         print(f"\n❌ Piper Error: {e}")
-        return False
+        return None
 
 # --- MENUS ---
 
@@ -295,12 +920,34 @@ def get_safe_filename(text):
 def mode_interactive():
     print(f"\n--- ⌨️  Interactive Mode ---")
     print("Tags: <break time='500ms'/>, <down/>, version: v1")
+    print("Type 'pool' to see which models are loaded.")
+    first_audio_times = []
     while True:
         text = input("\n📝 Say: ").strip()
         if not text: continue
         if text.lower() in ["back", "exit", "quit"]: break
+        if text.lower() == "pool":
+            print(f"   🧠 Pool: {MODEL_POOL.summary()}")
+            continue
         filename = get_safe_filename(text)
-        process_text_to_audio(text, filename)
+
+        # Autoplay streams into one long-lived player as chunks are ready
+        settings = get_settings()
+        player = None
+        if settings['autoplay']:
+            PLAYER.backend = settings.get("playback", "auto")
+            player = PLAYER
+
+        LAST_RENDER.clear()
+        process_text_to_audio(text, filename, settings=settings, player=player)
+        if player and "first_audio" in LAST_RENDER:
+            first_audio_times.append(LAST_RENDER["first_audio"])
+
+    PLAYER.stop()
+    if first_audio_times:
+        times = sorted(first_audio_times)
+        print(f"   ⏱️  Time to first audio over {len(times)} utterance(s): "
+              f"median {times[len(times)//2]:.2f} s | worst {times[-1]:.2f} s")
 
 def mode_read_file():
     print(f"\n--- 📄 File Reader ---")
@@ -318,27 +965,613 @@ def mode_read_file():
             content = f.read().strip()
         if content:
             out_name = os.path.basename(all_files[idx]).replace(".txt", ".wav")
-            process_text_to_audio(content, out_name)
+            process_text_to_audio(content, out_name, stream=get_settings().get("streaming", True))
     except Exception as e:
         print(f"❌ Error: {e}")
 
+# --- BATCH RENDERING ---
+
+BATCH_STATE_FILE = os.path.join(OUTPUT_WAVS_DIR, "batch_state.json")
+# Settings that change the audio (the rest only change speed)
+AUDIO_SETTINGS_KEYS = ["default_version", "length_scale", "noise_scale", "noise_w", "sentence_silence",
+                       "max_chunk_chars"]
+
+def get_render_hash(content, settings):
+    """Identifies a render: text, audio settings and the model file it resolves to."""
+    model_path, _ = resolve_model(content, settings, quiet=True)
+    model_hash = hash_file(model_path) if os.path.exists(model_path) else "missing"
+    audio_settings = {k: settings.get(k) for k in AUDIO_SETTINGS_KEYS}
+    blob = json.dumps([content, audio_settings, model_hash], sort_keys=True)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+def load_batch_state():
+    try:
+        with open(BATCH_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_batch_state(state):
+    # Write then rename, so an interrupted run never leaves a corrupt state file
+    tmp_path = BATCH_STATE_FILE + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, BATCH_STATE_FILE)
+
+def get_batch_files(pattern=None, manifest=None):
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            lines = [l.strip() for l in f]
+        return [l for l in lines if l and not l.startswith("#")]
+    return sorted(glob.glob(pattern or os.path.join(TXT_INPUT_DIR, "*.txt"), recursive=True))
+
+def get_batch_output_name(txt_path):
+    """
+    Output wav for an input: its path below TXT_INPUT_DIR (or else the current
+    folder), flattened (txts/ch.txt -> ch.wav, scripts/d1/ch.txt ->
+    scripts__d1__ch.wav). It only depends on the file itself, so adding or
+    removing other inputs never renames an output.
+    """
+    path = os.path.abspath(txt_path)
+    for root in (os.path.abspath(TXT_INPUT_DIR), os.getcwd()):
+        if path.startswith(os.path.join(root, "")):
+            relative = os.path.relpath(path, root)
+            break
+    else:
+        relative = os.path.splitdrive(path)[1].lstrip(os.sep)
+    return os.path.splitext(relative)[0].replace(os.sep, "__") + ".wav"
+
+def mode_batch(pattern=None, manifest=None, jobs=0, force=False):
+    """
+    Renders many text files without prompts. Files whose text, audio settings
+    and model are unchanged since the last render are skipped, so an
+    interrupted run picks up where it stopped.
+    """
+    print(f"\n--- 📚 Batch Render ---")
+    # The same file listed twice (e.g. by a manifest) would render onto itself
+    files, seen = [], set()
+    for txt_path in get_batch_files(pattern, manifest):
+        if os.path.abspath(txt_path) not in seen:
+            seen.add(os.path.abspath(txt_path))
+            files.append(txt_path)
+    if not files:
+        print(f"⚠️ No text files found.")
+        return
+
+    settings = get_settings()
+    jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+    jobs = max(1, min(jobs, len(files)))
+    # Parallelism is across files; each file renders its chunks in order
+    batch_settings = {**settings, "workers": jobs}
+
+    state = load_batch_state()
+    state_lock = threading.Lock()
+    stats = {"rendered": 0, "skipped": 0, "failed": 0, "audio": 0.0, "synth": 0.0}
+
+    # Output name -> the file rendered to it, so two inputs never share one (a__b/c.txt, a/b__c.txt)
+    owners = {os.path.normcase(entry["output"]): os.path.abspath(path)
+              for path, entry in state.items() if entry.get("output") and os.path.exists(path)}
+    todo = []
+    for txt_path in files:
+        try:
+            with open(txt_path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+        except Exception as e:
+            print(f"   ❌ {txt_path}: {e}")
+            stats["failed"] += 1
+            continue
+        if not content: continue
+
+        entry = state.get(txt_path, {})
+        # A file keeps the name it was first rendered under
+        out_name = entry.get("output") or get_batch_output_name(txt_path)
+        owner = owners.setdefault(os.path.normcase(out_name), os.path.abspath(txt_path))
+        if owner != os.path.abspath(txt_path):
+            print(f"   ❌ {txt_path}: {out_name} already belongs to {os.path.relpath(owner)}; rename one of them")
+            stats["failed"] += 1
+            continue
+        render_hash = get_render_hash(content, settings)
+        up_to_date = entry.get("hash") == render_hash and os.path.exists(os.path.join(OUTPUT_WAVS_DIR, out_name))
+        if up_to_date and not force:
+            stats["skipped"] += 1
+            continue
+        todo.append((txt_path, content, out_name, render_hash))
+
+    print(f"   {len(files)} file(s): {len(todo)} to render, {stats['skipped']} up to date | {jobs} worker(s)")
+
+    def render(job):
+        """Renders one file. Returns (txt_path, (audio_seconds, synth_seconds) or None, error)."""
+        txt_path, content, out_name, render_hash = job
+        # Render to a .part file first; only finished outputs get the real name
+        part_path = os.path.join(OUTPUT_WAVS_DIR, out_name + ".part")
+        try:
+            return txt_path, render_file(job, part_path), None
+        except Exception as e:
+            # One bad file must not stop the batch
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return txt_path, None, str(e)
+
+    def render_file(job, part_path):
+        txt_path, content, out_name, render_hash = job
+        start = time.perf_counter()
+        part_path = process_text_to_audio(content, os.path.basename(part_path), autoplay=False, stream=True,
+                                          settings=batch_settings, workers=1)
+        if not part_path:
+            return None
+        final_path = os.path.join(OUTPUT_WAVS_DIR, out_name)
+        os.replace(part_path, final_path)
+
+        with wave.open(final_path, 'rb') as w:
+            audio_seconds = w.getnframes() / w.getframerate()
+        synth_seconds = time.perf_counter() - start
+
+        with state_lock:
+            state[txt_path] = {
+                "hash": render_hash,
+                "output": out_name,
+                "audio_seconds": round(audio_seconds, 2),
+                "synth_seconds": round(synth_seconds, 2),
+            }
+            save_batch_state(state)
+        return audio_seconds, synth_seconds
+
+    wall_start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = [pool.submit(render, job) for job in todo]
+        for done, future in enumerate(as_completed(futures), 1):
+            txt_path, result, error = future.result()
+            if result is None:
+                stats["failed"] += 1
+                print(f"   ❌ Failed: {txt_path}" + (f" ({error})" if error else ""))
+                continue
+            audio_seconds, synth_seconds = result
+            stats["rendered"] += 1
+            stats["audio"] += audio_seconds
+            stats["synth"] += synth_seconds
+            print(f"   [{done}/{len(todo)}] {txt_path}: "
+                  f"{audio_seconds:.1f} s audio, RTF {synth_seconds / max(audio_seconds, 0.001):.3f}")
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        print("\n⏸️  Batch interrupted. Finished files are saved; run the same command again to resume.")
+        raise
+    pool.shutdown()
+    wall = time.perf_counter() - wall_start
+
+    print(f"\n--- ✅ Batch Complete ---")
+    print(f"   Rendered: {stats['rendered']} | Skipped: {stats['skipped']} | Failed: {stats['failed']}")
+    if stats["audio"] > 0:
+        print(f"   Audio:    {stats['audio']/60:.1f} min in {wall:.1f} s wall time")
+        print(f"   RTF:      {wall / stats['audio']:.3f} (wall) | {stats['synth'] / stats['audio']:.3f} (per worker)")
+        print(f"   Speed:    {stats['audio'] / wall:.1f}x real time")
+
+# --- HTTP SERVER ---
+
+def wav_header(sample_rate, data_bytes=None):
+    """44-byte header for 16-bit mono PCM. data_bytes=None means unknown length (streaming)."""
+    if data_bytes is None:
+        data_bytes = 0xFFFFFFFF - 36
+    return (b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b"data" + struct.pack("<I", data_bytes))
+
+def percentile(values, pct):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+class ServerStats:
+    """Admission control (bounded worker pool + bounded queue) and latency metrics."""
+
+    def __init__(self, workers, queue_max):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.slots = threading.Semaphore(workers)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1000)   # request received -> last byte
+        self.first_bytes = deque(maxlen=1000) # request received -> first audio
+
+    def admit(self):
+        # A free worker takes the request at once; only the rest count against the queue
+        if self.slots.acquire(blocking=False):
+            with self.lock: self.active += 1
+            return True
+        with self.lock:
+            if self.waiting >= self.queue_max:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+        self.slots.acquire()
+        with self.lock:
+            self.waiting -= 1
+            self.active += 1
+        return True
+
+    def release(self, latency=None, first_byte=None, error=False):
+        with self.lock:
+            self.active -= 1
+            if error:
+                self.errors += 1
+            else:
+                self.completed += 1
+                self.latencies.append(latency)
+                if first_byte is not None: self.first_bytes.append(first_byte)
+        self.slots.release()
+
+    def snapshot(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            first_bytes = list(self.first_bytes)
+            data = {
+                "queue_depth": self.waiting,
+                "active": self.active,
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "errors": self.errors,
+            }
+        data["latency_ms"] = {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in (50, 90, 99)}
+        data["first_audio_ms"] = {f"p{p}": round(percentile(first_bytes, p) * 1000, 1) for p in (50, 90, 99)}
+        with MODEL_POOL.lock:
+            data["model_pool"] = {"loaded": [get_model_label(p) for p in MODEL_POOL.engines],
+                                  "hits": MODEL_POOL.hits, "misses": MODEL_POOL.misses,
+                                  "evictions": MODEL_POOL.evictions}
+        data["cache"] = {"hits": SYNTH_CACHE.hits, "misses": SYNTH_CACHE.misses}
+        return data
+
+class TTSRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /synthesize   body: text with the usual tags (<break>, <down/>, version:)
+                       ?stream=1 sends chunked audio as it is synthesized
+                       ?format=raw sends s16le PCM instead of WAV
+    GET  /metrics      queue depth, latency percentiles, pool and cache counters
+    GET  /health
+    """
+    protocol_version = "HTTP/1.1"
+    server_version = "PiperForge"
+
+    def log_message(self, fmt, *args):
+        print(f"   🌐 {self.address_string()} {fmt % args}")
+
+    def _send_json(self, code, data):
+        body = json.dumps(data, indent=2).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._send_json(200, self.server.stats.snapshot())
+        elif path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/synthesize":
+            self.close_connection = True  # the unread body would be parsed as the next request
+            self._send_json(404, {"error": "not found"})
+            return
+
+        received = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0: raise ValueError(length)
+        except ValueError:
+            self.close_connection = True  # the body can't be skipped without its length
+            self._send_json(400, {"error": "bad Content-Length"})
+            return
+        body = self.rfile.read(length).decode('utf-8', errors='replace')
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try: body = json.loads(body).get("text", "")
+            except Exception: body = ""
+        text = body.strip()
+
+        query = parse_qs(url.query)
+        stream = query.get("stream", ["0"])[0] in ("1", "true", "yes")
+        raw = query.get("format", ["wav"])[0] == "raw"
+
+        settings = self.server.settings
+        model_path, plan = plan_text(text, settings, quiet=True)
+        if not plan:
+            self._send_json(400, {"error": "empty text"})
+            return
+
+        stats = self.server.stats
+        if not stats.admit():
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        first_byte = None
+        headers_sent = False
+        try:
+            sample_rate = get_model_sample_rate(model_path)
+            content_type = "audio/L16; rate=%d; channels=1" % sample_rate if raw else "audio/wav"
+
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                headers_sent = True
+                if not raw: self._write_chunk(wav_header(sample_rate))
+                for chunk in synthesize_plan(plan, model_path):
+                    if not chunk: continue
+                    if first_byte is None: first_byte = time.perf_counter() - received
+                    self._write_chunk(chunk)
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                pcm = bytearray()
+                for chunk in synthesize_plan(plan, model_path):
+                    if chunk: pcm += chunk
+                if not pcm:
+                    stats.release(error=True)
+                    self._send_json(500, {"error": "no audio generated"})
+                    return
+                payload = bytes(pcm) if raw else wav_header(sample_rate, len(pcm)) + bytes(pcm)
+                first_byte = time.perf_counter() - received
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            stats.release(error=True)
+            return
+        except Exception as e:
+            print(f"   ❌ Server Error: {e}")
+            stats.release(error=True)
+            if headers_sent:
+                # Mid-stream: end the connection without the final chunk, so the
+                # client sees a truncated response instead of waiting for more
+                self.close_connection = True
+            else:
+                try: self._send_json(500, {"error": str(e)})
+                except OSError: self.close_connection = True
+            return
+
+        stats.release(time.perf_counter() - received, first_byte)
+
+def mode_serve(host="127.0.0.1", port=5002):
+    """Local HTTP synthesis server; models stay warm in the pool between requests."""
+    settings = get_settings()
+    workers = max(1, int(settings.get("server_workers", 2)))
+    queue_max = max(0, int(settings.get("server_queue", 16)))
+
+    # Concurrency is across requests; each request renders its chunks in order
+    MODEL_POOL.configure({**settings, "workers": workers})
+    SYNTH_CACHE.max_mb = float(settings.get("cache_max_mb", SYNTH_CACHE.max_mb))
+
+    server = ThreadingHTTPServer((host, port), TTSRequestHandler)
+    server.daemon_threads = True
+    server.settings = settings
+    server.stats = ServerStats(workers, queue_max)
+
+    print(f"\n--- 🌐 Piper TTS Server ---")
+    print(f"   Listening on http://{host}:{port}  ({workers} worker(s), queue of {queue_max})")
+    print(f"   curl --data 'Hello there.' http://{host}:{port}/synthesize > hello.wav")
+    print(f"   curl http://{host}:{port}/metrics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Server stopped.")
+    finally:
+        server.server_close()
+        SYNTH_CACHE.save_stats()
+
+BENCHMARK_CHUNKS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Every chunk between two breaks used to reload the whole voice.",
+    "Short one.",
+    "This sentence is a little longer, so that the model has some real work to do for once.",
+    "Numbers like 42 and 1999 go through the phonemizer too.",
+]
+
+def benchmark_engines(rounds=3):
+    """Compares per-chunk latency of the piper binary and the in-process engine."""
+    print(f"\n--- 📊 Engine Benchmark (CPU) ---")
+    settings = get_settings()
+    model_path = find_model_path(settings.get("default_version", "").strip() or None)
+    print(f"   Model: {model_path}")
+
+    if not os.path.exists(model_path) or not os.path.exists(model_path + ".json"):
+        print(f"❌ Model or config missing: {model_path}")
+        input("Press Enter to continue...")
+        return
+
+    chunks = BENCHMARK_CHUNKS * rounds
+
+    def run(label, fn):
+        times = []
+        for text in chunks:
+            start = time.perf_counter()
+            if not fn(text):
+                print(f"   ❌ {label} failed.")
+                return None
+            times.append(time.perf_counter() - start)
+        times.sort()
+        mean = sum(times) / len(times)
+        print(f"   {label:<10} mean {mean*1000:7.1f} ms | median {times[len(times)//2]*1000:7.1f} ms | max {times[-1]*1000:7.1f} ms")
+        return mean
+
+    results = {}
+    if os.path.exists(PIPER_BINARY):
+        results["binary"] = run("Binary", lambda t: run_piper_cmd(t, settings, model_path))
+    else:
+        print(f"   ⚠️  Skipping binary: not found at {PIPER_BINARY}")
+
+    if HAS_ENGINE:
+        start = time.perf_counter()
+        MODEL_POOL.drop(model_path)
+        engine = get_engine(model_path)
+        print(f"   Engine cold load: {(time.perf_counter() - start)*1000:.1f} ms (paid once)")
+        results["engine"] = run("Engine", lambda t: engine.synthesize(t, settings))
+    else:
+        print("   ⚠️  Skipping engine: 'pip install onnxruntime piper-phonemize' to enable it.")
+
+    if results.get("binary") and results.get("engine"):
+        print(f"\n   🚀 Engine is {results['binary'] / results['engine']:.1f}x faster per chunk.")
+
+    input("Press Enter to continue...")
+
+def benchmark_book(paragraphs=300):
+    """Times a book-length render and reports peak memory of the whole process."""
+    print(f"\n--- 📚 Book-Length Benchmark ({paragraphs} paragraphs) ---")
+    sentences = BENCHMARK_CHUNKS * 3
+    paragraph = " ".join(sentences)
+    book = ' <break time="400ms"/> '.join([paragraph] * paragraphs)
+    print(f"   Input: {len(book):,} characters")
+
+    # Cache off: the book repeats paragraphs, we want to time real synthesis
+    settings = {**get_settings(), "cache": False}
+    stream = settings.get("streaming", True)
+    print(f"   Mode:  {'streaming to disk' if stream else 'in-memory buffer'} (\"streaming\" setting)")
+
+    rss_before = get_rss_mb()
+    start = time.perf_counter()
+    final_path = process_text_to_audio(book, "benchmark_book.wav", autoplay=False, stream=stream,
+                                       settings=settings)
+    elapsed = time.perf_counter() - start
+
+    if final_path:
+        with wave.open(final_path, 'rb') as w:
+            audio_seconds = w.getnframes() / w.getframerate()
+            audio_mb = w.getnframes() * 2 / (1024 * 1024)
+        print(f"   ⏱️  Wall time:  {elapsed:.1f} s for {audio_seconds/60:.1f} min of audio (RTF {elapsed/audio_seconds:.3f})")
+        print(f"   💾 Output PCM: {audio_mb:.1f} MB")
+        print(f"   📈 Peak RSS:   {get_peak_rss_mb():.1f} MB (was {rss_before:.1f} MB before the render)")
+        os.remove(final_path)
+    input("Press Enter to continue...")
+
+def benchmark_chunk_sizes(sizes=(0, 80, 150, 300, 600), paragraphs=10):
+    """Real-time factor and time-to-first-chunk for different max_chunk_chars."""
+    print(f"\n--- ✂️  Chunk Size Benchmark ---")
+    # One long untagged text: without segmentation it is a single giant input
+    text = " ".join(BENCHMARK_CHUNKS * 2 * paragraphs)
+    print(f"   Input: {len(text):,} characters, no <break> tags")
+
+    base = {**get_settings(), "cache": False}
+    model_path, _ = resolve_model(text, base, quiet=True)
+    sample_rate = get_model_sample_rate(model_path)
+    workers = get_worker_count(base, os.cpu_count() or 1)
+
+    print(f"\n   {'max_chunk_chars':>15} | {'chunks':>6} | {'first chunk':>11} | {'total':>8} | {'RTF':>6}")
+    for size in sizes:
+        settings = {**base, "max_chunk_chars": size}
+        units = segment_text(text, size)
+        plan = [(i, None, unit, settings) for i, unit in enumerate(units)]
+
+        start = time.perf_counter()
+        first = None
+        samples = 0
+        for chunk in synthesize_plan(plan, model_path, min(workers, len(plan))):
+            if first is None: first = time.perf_counter() - start
+            if chunk: samples += len(chunk) // 2
+        elapsed = time.perf_counter() - start
+        if not samples:
+            print(f"   ❌ No audio generated.")
+            break
+        label = size if size > 0 else "off"
+        print(f"   {label:>15} | {len(plan):>6} | {first:>9.2f} s | {elapsed:>6.2f} s | {elapsed / (samples / sample_rate):>6.3f}")
+    input("\nPress Enter to continue...")
+
+def mode_benchmark():
+    print(f"\n--- 📊 Benchmarks ---")
+    print("1. Per-chunk latency (binary vs engine)")
+    print("2. Book-length render (time & memory)")
+    print("3. RTF vs chunk size")
+    choice = input("\n> ").strip()
+    if choice == "1": benchmark_engines()
+    elif choice == "2": benchmark_book()
+    elif choice == "3": benchmark_chunk_sizes()
+
+def stream_file_to_stdout(txt_path):
+    """Writes raw 16-bit mono PCM of a text file to stdout as it is synthesized."""
+    raw_out = sys.stdout.buffer
+    # Keep stdout clean for the audio; progress goes to stderr
+    sys.stdout = sys.stderr
+
+    ensure_setup()
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    try:
+        process_text_to_audio(content, None, autoplay=False, stream=True, raw_out=raw_out)
+    except BrokenPipeError:
+        pass
+
 def main():
+    parser = argparse.ArgumentParser(description="Piper TTS Manager")
+    parser.add_argument("--stdout", metavar="TXT",
+                        help="stream raw PCM of a text file to stdout, e.g. | aplay -t raw -f S16_LE -c 1 -r 22050")
+    parser.add_argument("--batch", nargs="?", const="", metavar="GLOB",
+                        help=f"render every .txt without prompts (default: {TXT_INPUT_DIR}/*.txt)")
+    parser.add_argument("--manifest", metavar="FILE", help="with --batch: render the paths listed in FILE, one per line")
+    parser.add_argument("--jobs", type=int, default=0, help="with --batch: files rendered at once (default: one per CPU core)")
+    parser.add_argument("--force", action="store_true", help="with --batch: re-render files that are up to date")
+    parser.add_argument("--serve", action="store_true", help="run the local HTTP synthesis server")
+    parser.add_argument("--host", default="127.0.0.1", help="with --serve: address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=5002, help="with --serve: port (default: 5002)")
+    parser.add_argument("--cache-stats", action="store_true", help="print synthesis cache statistics and exit")
+    args = parser.parse_args()
+
+    if args.cache_stats:
+        show_cache_stats(pause=False)
+        return
+
+    if args.stdout:
+        stream_file_to_stdout(args.stdout)
+        return
+
+    if args.serve:
+        ensure_setup()
+        mode_serve(args.host, args.port)
+        return
+
+    if args.batch is not None or args.manifest:
+        ensure_setup()
+        mode_batch(args.batch or None, args.manifest, args.jobs, args.force)
+        return
+
     ensure_setup()
+    MODEL_POOL.configure(get_settings())
     while True:
         os.system('clear')
         print("\n" + "="*40)
         print(f"   🎙️  PIPER TTS MANAGER (Linux)")
         print(f"   📁 Models Dir: {MODELS_DIR}")
+        if HAS_ENGINE:
+            print(f"   🧠 Pool: {MODEL_POOL.summary()}")
         print("="*40)
         print("1. ⌨️  Type & Speak")
         print("2. 📄 Read File")
         print("3. ⚙️ Reset Settings")
-        print("4. 🚪 Exit")
+        print("4. 📊 Benchmarks")
+        print("5. 🗄️  Cache Stats")
+        print("6. 🚪 Exit")
         choice = input("\n> ").strip()
         if choice == "1": mode_interactive()
         elif choice == "2": mode_read_file()
         elif choice == "3": regenerate_default_settings()
-        elif choice == "4": sys.exit(0)
+        elif choice == "4": mode_benchmark()
+        elif choice == "5": show_cache_stats()
+        elif choice == "6": sys.exit(0)
 
 if __name__ == "__main__":
     try: main()
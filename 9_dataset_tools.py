@@ -0,0 +1,404 @@
+import os
+import re
+import sys
+import time
+import zlib
+import shutil
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+from tqdm import tqdm
+from config import *
+
+# --- SETTINGS ---
+METADATA_PATH = os.path.join(DATASET_DIR, "metadata.csv")
+WAVS_DIR = os.path.join(DATASET_DIR, "wavs")
+# Compact columnar cache of per-clip features, one array per column
+INDEX_PATH = os.path.join(DATASET_DIR, "quality_index.npz")
+OUTLIERS_PATH = os.path.join(DATASET_DIR, "quality_outliers.csv")
+REJECTED_PATH = os.path.join(DATASET_DIR, "rejected.csv")
+BACKUP_METADATA_PATH = os.path.join(DATASET_DIR, "metadata_before_clean.csv")
+
+# Columns computed from the audio (expensive, only redone for new or changed WAVs).
+# Text columns are cheap and refreshed from metadata.csv on every update.
+AUDIO_COLUMNS = ("duration", "rms_db", "peak_db", "clip_ratio", "snr_db")
+TEXT_COLUMNS = ("text_len", "chars_per_sec")
+
+CLIP_LEVEL = 0.999   # |sample| at or above this counts as clipped
+SNR_FRAME = 1024     # ~46ms frames for the SNR estimate
+
+# Outlier thresholds for the report
+MAX_CLIP_RATIO = 0.001
+MIN_SNR_DB = 10.0
+MIN_RMS_DB = -40.0
+RATE_MAD_LIMIT = 3.5  # speaking rate: robust z-score (median/MAD) limit
+
+# Cleaning
+NGRAM = 3                 # words per shingle
+MINHASH_BANDS = 8         # LSH: 8 bands x 4 rows finds pairs from ~60% similarity up
+MINHASH_ROWS = 4
+NEAR_DUP_JACCARD = 0.8    # shingle overlap that counts as the same transcript
+REPEAT_LIMIT = 3          # same transcript this many times = Whisper hallucination
+DUP_DURATION_TOL = 0.05   # same transcript and length within 5% = duplicated clip
+MIN_UNIQUE_NGRAMS = 0.5   # below this share of distinct shingles, Whisper was looping
+
+def read_metadata(path=METADATA_PATH):
+    """Returns [(clip filename, text)] in file order."""
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            clip, _, text = line.partition('|')
+            rows.append((clip, text))
+    return rows
+
+def clip_path(clip):
+    path = os.path.join(WAVS_DIR, clip)
+    return path if clip.endswith(".wav") else path + ".wav"
+
+def to_db(value):
+    return float(10 * np.log10(max(value, 1e-10)))
+
+# --- QUALITY INDEX ---
+
+def analyze_clip(path):
+    """Audio features of one clip, in AUDIO_COLUMNS order (NaN if unreadable)."""
+    try:
+        y, sr = sf.read(path, dtype='float32', always_2d=True)
+    except Exception:
+        return (np.nan,) * len(AUDIO_COLUMNS)
+    y = y.mean(axis=1)
+    if len(y) == 0:
+        return (0.0,) + (np.nan,) * (len(AUDIO_COLUMNS) - 1)
+
+    power = float(np.mean(y * y))
+    peak = float(np.max(np.abs(y)))
+    clip_ratio = float(np.mean(np.abs(y) >= CLIP_LEVEL))
+
+    # Rough SNR: loud frames (speech) vs the quietest frames (noise floor)
+    n = len(y) // SNR_FRAME
+    if n >= 4:
+        frames = y[:n * SNR_FRAME].reshape(n, SNR_FRAME)
+        frame_power = np.einsum('ij,ij->i', frames, frames) / SNR_FRAME
+        snr_db = to_db(np.percentile(frame_power, 90)) - to_db(np.percentile(frame_power, 10))
+    else:
+        snr_db = np.nan
+
+    return len(y) / sr, to_db(power), to_db(peak * peak), clip_ratio, snr_db
+
+def load_index():
+    """The cached index as {column: array}, or None if there is none yet."""
+    if not os.path.exists(INDEX_PATH):
+        return None
+    try:
+        with np.load(INDEX_PATH) as data:
+            return {name: data[name] for name in data.files}
+    except Exception:
+        return None
+
+def save_index(index):
+    # Write then rename, so an interrupted run never leaves a corrupt index
+    tmp_path = INDEX_PATH + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **index)
+    os.replace(tmp_path, INDEX_PATH)
+
+def update_index(verbose=True):
+    """
+    Brings the index in line with metadata.csv: features are computed (in
+    parallel) only for clips that are new or whose WAV changed size or mtime.
+    Returns the index, rows in metadata.csv order.
+    """
+    rows = read_metadata()
+    if not rows:
+        if verbose: print(f"❌ No clips found in {METADATA_PATH}")
+        return None
+
+    old = load_index()
+    old_rows = {}
+    if old is not None:
+        old_rows = {clip: i for i, clip in enumerate(old["clip"])}
+
+    n = len(rows)
+    index = {
+        "clip": np.array([clip for clip, _ in rows]),
+        "size": np.full(n, -1, dtype=np.int64),
+        "mtime_ns": np.zeros(n, dtype=np.int64),
+    }
+    for name in AUDIO_COLUMNS:
+        index[name] = np.full(n, np.nan, dtype=np.float32)
+
+    todo = []
+    for i, (clip, _) in enumerate(rows):
+        try:
+            stat = os.stat(clip_path(clip))
+        except OSError:
+            continue  # missing WAV: stays NaN, size -1
+        index["size"][i], index["mtime_ns"][i] = stat.st_size, stat.st_mtime_ns
+
+        j = old_rows.get(clip)
+        if j is not None and old["size"][j] == stat.st_size and old["mtime_ns"][j] == stat.st_mtime_ns:
+            for name in AUDIO_COLUMNS:
+                index[name][i] = old[name][j]
+        else:
+            todo.append(i)
+
+    if todo:
+        if verbose: print(f"   🔬 Analyzing {len(todo)} new or changed clip(s) ({n - len(todo)} cached)...")
+        paths = [clip_path(rows[i][0]) for i in todo]
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            results = pool.map(analyze_clip, paths, chunksize=64)
+            for i, features in zip(todo, tqdm(results, total=len(todo), unit="clip", leave=False, disable=not verbose)):
+                for name, value in zip(AUDIO_COLUMNS, features):
+                    index[name][i] = value
+    elif verbose:
+        print(f"   ✅ All {n} clips cached.")
+
+    index["text_len"] = np.array([len(text) for _, text in rows], dtype=np.int32)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index["chars_per_sec"] = (index["text_len"] / index["duration"]).astype(np.float32)
+
+    save_index(index)
+    return index
+
+# --- REPORTS ---
+
+def robust_z(values):
+    """Distance from the median in MADs (NaN stays NaN)."""
+    median = np.nanmedian(values)
+    mad = np.nanmedian(np.abs(values - median)) * 1.4826
+    return (values - median) / max(mad, 1e-9)
+
+def find_outliers(index):
+    """{reason: boolean mask} over the index rows."""
+    with np.errstate(invalid='ignore'):
+        return {
+            "missing or unreadable": np.isnan(index["duration"]),
+            "clipping": index["clip_ratio"] > MAX_CLIP_RATIO,
+            "low snr": index["snr_db"] < MIN_SNR_DB,
+            "too quiet": index["rms_db"] < MIN_RMS_DB,
+            "speaking rate": np.abs(robust_z(index["chars_per_sec"])) > RATE_MAD_LIMIT,
+        }
+
+def show_report(index=None, examples=5):
+    start = time.perf_counter()
+    if index is None:
+        index = update_index()
+    if index is None:
+        return
+
+    durations = index["duration"]
+    print(f"\n--- 📋 Dataset Quality Report ({len(durations)} clips, {np.nansum(durations) / 3600:.2f} h) ---")
+    print(f"\n   {'feature':>14} | {'min':>8} | {'p5':>8} | {'median':>8} | {'p95':>8} | {'max':>8}")
+    for name in AUDIO_COLUMNS + TEXT_COLUMNS:
+        values = index[name].astype(np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0: continue
+        p = np.percentile(values, [0, 5, 50, 95, 100])
+        print(f"   {name:>14} | " + " | ".join(f"{v:>8.3g}" for v in p))
+
+    outliers = find_outliers(index)
+    print("\n   Outliers:")
+    for reason, mask in outliers.items():
+        flagged = np.flatnonzero(mask)
+        sample = ", ".join(str(index["clip"][i]) for i in flagged[:examples])
+        print(f"   {'⚠️ ' if len(flagged) else '✅'} {reason:<22} {len(flagged):>6}  {sample}{' ...' if len(flagged) > examples else ''}")
+
+    # Full list, one row per flagged clip
+    flagged_any = np.logical_or.reduce(list(outliers.values()))
+    with open(OUTLIERS_PATH, 'w', encoding='utf-8') as f:
+        f.write("clip|reasons|" + "|".join(AUDIO_COLUMNS + TEXT_COLUMNS) + "\n")
+        for i in np.flatnonzero(flagged_any):
+            reasons = ",".join(r for r, mask in outliers.items() if mask[i])
+            values = "|".join(f"{index[name][i]:.4g}" for name in AUDIO_COLUMNS + TEXT_COLUMNS)
+            f.write(f"{index['clip'][i]}|{reasons}|{values}\n")
+    print(f"\n   📄 {int(flagged_any.sum())} flagged clip(s) listed in {OUTLIERS_PATH}")
+    print(f"   ⏱️  {time.perf_counter() - start:.2f} s")
+
+# --- CLEANING ---
+
+def normalize_text(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def shingle_hashes(words):
+    """crc32 of every NGRAM-word shingle (the whole text if it is shorter)."""
+    if len(words) < NGRAM:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + NGRAM]) for i in range(len(words) - NGRAM + 1)]
+    return np.array([zlib.crc32(g.encode('utf-8')) for g in grams], dtype=np.uint64)
+
+def minhash(hashes, a, b):
+    """MinHash signature: per hash function, the smallest multiply-shift hash of the shingles."""
+    # uint64 arithmetic wraps around, which is the "mod 2^64" of the hash family
+    return ((hashes[None, :] * a[:, None] + b[:, None]) >> np.uint64(32)).min(axis=1)
+
+def group_transcripts(texts):
+    """
+    Groups clips whose normalized transcripts are identical or near-identical
+    (shingle Jaccard >= NEAR_DUP_JACCARD). Identical texts are bucketed by
+    hash first; near matches come from MinHash LSH candidates, so the work is
+    close to linear in the number of clips. Returns lists of clip indices.
+    """
+    by_text = defaultdict(list)
+    for i, text in enumerate(texts):
+        by_text[" ".join(normalize_text(text))].append(i)
+    unique = list(by_text)
+    shingles = [shingle_hashes(t.split()) for t in unique]
+
+    # Union-find over the unique texts
+    parent = list(range(len(unique)))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    rng = np.random.default_rng(0)
+    n_hashes = MINHASH_BANDS * MINHASH_ROWS
+    a = rng.integers(1, 2**63, n_hashes, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, n_hashes, dtype=np.uint64)
+    buckets = defaultdict(list)
+    for u, hashes in enumerate(shingles):
+        signature = minhash(hashes, a, b)
+        for band in range(MINHASH_BANDS):
+            buckets[(band, signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS].tobytes())].append(u)
+
+    sets = [set(h.tolist()) for h in shingles]
+    checked = set()
+    for members in buckets.values():
+        for x in members[1:]:
+            pair = (members[0], x)
+            if pair in checked or find(pair[0]) == find(x): continue
+            checked.add(pair)
+            union = len(sets[pair[0]] | sets[x])
+            if union and len(sets[pair[0]] & sets[x]) / union >= NEAR_DUP_JACCARD:
+                parent[find(x)] = find(pair[0])
+
+    groups = defaultdict(list)
+    for u, text in enumerate(unique):
+        groups[find(u)].extend(by_text[text])
+    return [sorted(g) for g in groups.values() if len(g) > 1]
+
+def find_rejects(rows, index):
+    """{clip row: (reason, detail)} for hallucinated, duplicated and mismatched clips."""
+    rejects = {}
+    texts = [text for _, text in rows]
+
+    # 1. Whisper stuck in a loop: the same few words over and over
+    for i, text in enumerate(texts):
+        hashes = shingle_hashes(normalize_text(text))
+        if len(hashes) >= 6 and len(np.unique(hashes)) / len(hashes) < MIN_UNIQUE_NGRAMS:
+            rejects[i] = ("looping transcript", f"{len(np.unique(hashes))}/{len(hashes)} distinct {NGRAM}-grams")
+
+    # 2. Same transcript across clips: repeated hallucination or duplicated audio
+    durations = index["duration"]
+    for group in group_transcripts(texts):
+        if len(group) >= REPEAT_LIMIT:
+            for i in group:
+                rejects.setdefault(i, ("repeated transcript", f"{len(group)} clips share this text"))
+            continue
+        kept = []
+        for i in group:
+            match = next((k for k in kept if abs(durations[i] - durations[k]) <= DUP_DURATION_TOL * durations[k]), None)
+            if match is None:
+                kept.append(i)
+            else:
+                rejects.setdefault(i, ("duplicate clip", f"same text and length as {rows[match][0]}"))
+
+    # 3. Transcript length doesn't fit the audio length
+    z = robust_z(index["chars_per_sec"])
+    for i in np.flatnonzero(np.abs(z) > RATE_MAD_LIMIT):
+        side = "too long" if z[i] > 0 else "too short"
+        rejects.setdefault(int(i), ("duration/text mismatch",
+                                    f"text {side} for {durations[i]:.1f}s ({index['chars_per_sec'][i]:.1f} chars/s)"))
+    return rejects
+
+def clean_dataset(write=None):
+    """
+    Writes a rejection report and metadata.csv without the rejected clips (old
+    one kept as a backup). write=None asks first.
+    """
+    start = time.perf_counter()
+    print("\n--- 🧽 Duplicate & Hallucination Check ---")
+    index = update_index()
+    if index is None:
+        return
+    rows = read_metadata()
+
+    rejects = find_rejects(rows, index)
+    counts = defaultdict(int)
+    for reason, _ in rejects.values():
+        counts[reason] += 1
+    for reason in ("looping transcript", "repeated transcript", "duplicate clip", "duration/text mismatch"):
+        print(f"   {'⚠️ ' if counts[reason] else '✅'} {reason:<24} {counts[reason]:>6}")
+
+    with open(REJECTED_PATH, 'w', encoding='utf-8') as f:
+        f.write("clip|reason|detail|text\n")
+        for i in sorted(rejects):
+            reason, detail = rejects[i]
+            f.write(f"{rows[i][0]}|{reason}|{detail}|{rows[i][1]}\n")
+    print(f"\n   📄 {len(rejects)} of {len(rows)} clip(s) rejected, see {REJECTED_PATH}")
+    print(f"   ⏱️  {time.perf_counter() - start:.2f} s")
+
+    if write is None and rejects:
+        write = input("\nRewrite metadata.csv without these clips? (y/n): ").strip().lower() == "y"
+    if not write or not rejects:
+        return
+    # The WAVs stay on disk; restoring the backup undoes the cleaning
+    shutil.copyfile(METADATA_PATH, BACKUP_METADATA_PATH)
+    tmp_path = METADATA_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("".join(f"{clip}|{text}\n" for i, (clip, text) in enumerate(rows) if i not in rejects))
+    os.replace(tmp_path, METADATA_PATH)
+    print(f"   ✅ Cleaned {METADATA_PATH} ({len(rows) - len(rejects)} clips). Previous version: {BACKUP_METADATA_PATH}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and clean the sliced dataset.")
+    parser.add_argument("--index", action="store_true", help="build or update the quality index and exit")
+    parser.add_argument("--report", action="store_true", help="print the quality / outlier report and exit")
+    parser.add_argument("--clean", action="store_true",
+                        help="drop duplicated, hallucinated and mismatched clips from metadata.csv and exit")
+    parser.add_argument("--dry-run", action="store_true", help="with --clean: only write the rejection report")
+    args = parser.parse_args()
+
+    if args.index:
+        update_index()
+        return
+    if args.report:
+        show_report()
+        return
+    if args.clean:
+        clean_dataset(write=not args.dry_run)
+        return
+
+    while True:
+        print("\n" + "="*40)
+        print("      🧹 DATASET TOOLS")
+        print("="*40)
+        print("1. 🔬 Update Quality Index")
+        print("2. 📋 Quality & Outlier Report")
+        print("3. 🧽 Remove Duplicates & Hallucinations")
+        print("4. 🚪 Exit")
+
+        choice = input("\nChoose option: ").strip()
+
+        if choice == "1":
+            update_index()
+        elif choice == "2":
+            show_report()
+        elif choice == "3":
+            clean_dataset()
+        elif choice == "4":
+            print("👋 Bye")
+            sys.exit(0)
+        else:
+            print("Invalid option.")
+
+if __name__ == "__main__":
+    main()
@@ -22,15 +22,49 @@ SAMPLE_RATE = 22050
 # "en-us" for American, "en-gb" for British
 LANGUAGE_CODE = "en-us" 
 
+# --- SLICING & TRANSCRIPTION (Script 2) ---
+# Clip lengths the slicer aims for (Piper hates < 1s and > 10s). Longer speech
+# is split at its quietest point, shorter pieces are merged with a neighbour.
+SEGMENT_MIN_SECONDS = 1.0
+SEGMENT_MAX_SECONDS = 10.0
+# Longest pause that may end up inside a merged clip
+SEGMENT_MAX_GAP_SECONDS = 0.5
+
+# Whisper model for the slicer: "auto" picks the largest that fits your GPU (or CPU).
+# Or force one: "large" needs ~10GB VRAM, "medium" ~5GB, "small" ~2GB.
+WHISPER_MODEL = "auto"
+# Quantize Whisper to int8 when running on CPU (faster, small accuracy cost)
+WHISPER_QUANTIZE = True
+# Clips transcribed per Whisper forward pass. Lower it if you run out of (V)RAM.
+WHISPER_BATCH_SIZE = 16
+# Raw files decoded & sliced in parallel while Whisper runs (0 = one per CPU core)
+SLICER_WORKERS = 0
+
+# --- PREPROCESSING (Script 3) ---
+# metadata.csv is split into this many shards, preprocessed in parallel (0 = one per 2 CPU cores, max 8)
+PREPROCESS_SHARDS = 0
+
 # --- TRAINING HYPERPARAMETERS ---
 # "medium" = Fast, Robust (Recommended). "high" = Better quality, slower, requires cleaner audio.
 QUALITY = "medium" 
 # Batch Size: 32 for Medium (RTX 3060+), 16 or 8 if you run out of VRAM.
 BATCH_SIZE = 8 
+# Group clips of similar length into batches to cut padding:
+# "frames" (audio length), "tokens" (phonemes) or "off" (fixed BATCH_SIZE batches)
+TRAIN_BUCKETING = "frames"
+# Padded frames/tokens per bucketed batch (0 = BATCH_SIZE x the average clip length)
+BUCKET_BUDGET = 0
 # How often to save a checkpoint (in epochs)
 SAVE_EVERY_EPOCHS = 20 
 # Total epochs (you can stop earlier manually)
 MAX_EPOCHS = 6000 
+# "auto" tries each precision your hardware supports for a few steps and keeps
+# the fastest (saved in training_checkpoints/train_hardware.json).
+# Or force them: TRAIN_ACCELERATOR "gpu"/"cpu", TRAIN_PRECISION "32"/"16"/"bf16".
+TRAIN_ACCELERATOR = "auto"
+TRAIN_PRECISION = "auto"
+# GPUs to train on (0 = all of them)
+TRAIN_DEVICES = 0
 
 # --- BASE MODEL (Transfer Learning) ---
 # We download this once to start training on top of it.
@@ -0,0 +1,49 @@
+# length_buckets.py
+# The batch plan behind Script 4's length bucketing. Plain Python, so it can be
+# used as a DataLoader batch_sampler and tested without torch.
+import random
+
+class LengthBucketSampler:
+    """
+    Batches clips of similar length, as many per batch as fit in `budget`
+    padded tokens/frames (longest clip x batch size). Batch sizes stay the
+    same every epoch; which clips share a batch and the batch order don't.
+    With several devices each gets an equal share, so up to `replicas - 1`
+    batches are dropped per epoch (a different few each epoch).
+    """
+    def __init__(self, lengths, budget, rank=0, replicas=1, seed=1234):
+        self.lengths = lengths
+        self.budget = budget
+        self.rank = rank
+        self.replicas = replicas
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def plan(self, epoch):
+        rng = random.Random(self.seed + epoch)
+        order = sorted(range(len(self.lengths)), key=lambda i: (self.lengths[i], rng.random()))
+        batches, batch = [], []
+        for i in order:
+            if batch and self.lengths[i] * (len(batch) + 1) > self.budget:
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        rng.shuffle(batches)
+        # Every device must get the same number of batches, at least one each
+        if len(batches) < self.replicas:
+            batches = (batches * self.replicas)[:self.replicas]
+        usable = len(batches) - len(batches) % self.replicas
+        return batches[self.rank:usable:self.replicas]
+
+    def __iter__(self):
+        batches = self.plan(self.epoch)
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self):
+        return len(self.plan(0))
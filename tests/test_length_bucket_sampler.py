@@ -0,0 +1,31 @@
+# Run from the repo root: python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from length_buckets import LengthBucketSampler
+
+def plans(lengths, budget, replicas, epoch=0):
+    return [LengthBucketSampler(lengths, budget, rank=rank, replicas=replicas).plan(epoch)
+            for rank in range(replicas)]
+
+def test_every_clip_once_on_one_device():
+    lengths = [10, 20, 30, 40, 50, 60, 70, 80]
+    (batches,) = plans(lengths, budget=100, replicas=1)
+    assert sorted(i for b in batches for i in b) == list(range(len(lengths)))
+    assert all(max(lengths[i] for i in b) * len(b) <= 100 or len(b) == 1 for b in batches)
+
+def test_devices_get_equal_batch_counts():
+    lengths = [10] * 50  # 5 batches of 10 over 3 devices: two batches dropped
+    per_rank = plans(lengths, budget=100, replicas=3)
+    assert [len(p) for p in per_rank] == [1, 1, 1]
+
+def test_more_devices_than_batches():
+    lengths = [10] * 20  # 2 batches over 4 devices
+    per_rank = plans(lengths, budget=100, replicas=4)
+    assert [len(p) for p in per_rank] == [1, 1, 1, 1]
+    assert sorted(i for p in per_rank for b in p for i in b) == sorted(list(range(20)) * 2)
+
+def test_len_matches_plan():
+    sampler = LengthBucketSampler([10] * 20, 100, rank=3, replicas=4)
+    assert len(sampler) == len(list(iter(sampler))) == 1